@@ -0,0 +1,112 @@
+"""
+Order archival.
+
+Completed and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are moved,
+with their items, from orders/order_items into orders_archive and
+order_items_archive in batches, keeping the hot tables and their indexes
+small. IDs are preserved, and crud's order reads fall back to the archive, so
+archived orders can still be looked up. Archived orders are read-only.
+
+    cd Backend && python -m archive [--older-than-days 365] [--batch-size 1000]
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import models
+
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "365"))
+ORDER_ARCHIVE_BATCH = int(os.getenv("ORDER_ARCHIVE_BATCH", "1000"))
+ARCHIVABLE_STATUSES = ("completed", "cancelled")
+
+
+def archive_horizon(now: Optional[datetime] = None) -> datetime:
+    """Orders created at or after this (naive UTC) instant are never archived."""
+    return (now or datetime.utcnow()) - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def _archive_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    # Keep the newest order hot so SQLite never hands out an archived ID again
+    newest = select(func.max(models.Order.id)).scalar_subquery()
+    ids = db.scalars(
+        select(models.Order.id).where(
+            models.Order.created_at < cutoff,
+            models.Order.status.in_(ARCHIVABLE_STATUSES),
+            models.Order.id < newest
+        ).order_by(models.Order.id).limit(batch_size).with_for_update(skip_locked=True)
+    ).all()
+    if not ids:
+        return 0
+
+    now = datetime.utcnow()
+    db.execute(insert(models.ArchivedOrder).from_select(
+        ["id", "user_id", "status", "total", "created_at", "archived_at"],
+        select(
+            models.Order.id, models.Order.user_id, models.Order.status,
+            models.Order.total, models.Order.created_at,
+            literal(now, models.ArchivedOrder.archived_at.type)
+        ).where(models.Order.id.in_(ids))
+    ))
+    db.execute(insert(models.ArchivedOrderItem).from_select(
+        ["id", "order_id", "product_id", "quantity", "price", "category"],
+        select(
+            models.OrderItem.id, models.OrderItem.order_id, models.OrderItem.product_id,
+            models.OrderItem.quantity, models.OrderItem.price, models.OrderItem.category
+        ).where(models.OrderItem.order_id.in_(ids))
+    ))
+    db.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(ids)))
+    db.execute(delete(models.Order).where(models.Order.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def archive_orders(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    batch_size: int = ORDER_ARCHIVE_BATCH,
+    max_batches: Optional[int] = None
+) -> int:
+    """
+    Move eligible orders to the archive, one transaction per batch.
+
+    Returns the number of orders archived. Safe to interrupt and re-run.
+    Order history reads assume nothing newer than archive_horizon() is
+    archived, so `older_than_days` may not undercut ORDER_ARCHIVE_AFTER_DAYS.
+    """
+    days = ORDER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    if days < ORDER_ARCHIVE_AFTER_DAYS:
+        raise ValueError(f"older_than_days must be at least ORDER_ARCHIVE_AFTER_DAYS ({ORDER_ARCHIVE_AFTER_DAYS})")
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = _archive_batch(db, cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        batches += 1
+    return total
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Move old completed and cancelled orders to the archive tables.")
+    parser.add_argument("--older-than-days", type=int, default=ORDER_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ORDER_ARCHIVE_BATCH)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        moved = archive_orders(db, args.older_than_days, args.batch_size, args.max_batches)
+        print(f"Archived {moved} orders")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,116 @@
 """Authentication utilities - JWT tokens and password hashing."""
 import os
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
+from cache import LRUCache
 from database import get_db
+from hashing import PasswordHasher, PasswordHasherBusy, make_context
 import models, schemas
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+# Users allowed to call store-wide reporting and fulfilment endpoints
+ADMIN_USER_IDS = frozenset(int(i) for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip())
 
-# Password hashing - use argon2 to avoid bcrypt's 72-byte limit
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Password hashing - use argon2 to avoid bcrypt's 72-byte limit, on its own
+# bounded pool so login bursts cannot starve the request threadpool
+pwd_context = make_context()
+password_hasher = PasswordHasher(pwd_context)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# Same scheme, but a missing token yields None instead of a 401
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as routes see it; load the User row if more is needed."""
+    id: int
+    is_active: bool
+    name: Optional[str] = None
+
+
+# Resolved principals per (user ID, token ID), so most authenticated requests
+# skip the users query. Commits that change or delete a user drop its entries.
+principal_cache = LRUCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+)
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Forget cached principals for a user; call after changing users with bulk SQL."""
+    principal_cache.pop_where(lambda key: key[0] == user_id)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _note_user_changed(mapper, connection, target) -> None:
+    object_session(target).info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    # After commit, so a concurrent miss cannot re-cache the old row
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_users(session: Session, previous_transaction) -> None:
+    session.info.pop("changed_user_ids", None)
+
+
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against its hash. Raises 503 if the hashing pool is full."""
+    try:
+        return password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password."""
-    return pwd_context.hash(password)
+    """Hash a password. Raises 503 if the hashing pool is full."""
+    try:
+        return password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password for async routes; waits without holding a request thread."""
+    try:
+        return await password_hasher.verify_async(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash for async routes; waits without holding a request thread."""
+    try:
+        return await password_hasher.hash_async(password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -39,13 +118,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def _load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    row = db.query(models.User.id, models.User.is_active, models.User.name).filter(models.User.id == user_id).first()
+    return Principal(id=row.id, is_active=bool(row.is_active), name=row.name) if row else None
+
+
 def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
-) -> models.User:
+) -> Principal:
     """Get the current authenticated user from JWT token."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,20 +146,34 @@ def get_current_user(
         user_id = int(user_id_str)
     except (JWTError, ValueError):
         raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+
+    # Tokens issued before jti was added are keyed by the token itself
+    key = (user_id, payload.get("jti") or token)
+
+    def load() -> Principal:
+        principal = _load_principal(db, user_id)
+        if principal is None:
+            raise credentials_exception  # Not cached; get_or_load only stores returned values
+        return principal
+
+    user = principal_cache.get_or_load(key, load)
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
     return user
 
 
+def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """Require an authenticated user listed in ADMIN_USER_IDS."""
+    if current_user.id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
 def get_current_user_optional(
-    token: Optional[str] = Depends(oauth2_scheme),
+    token: Optional[str] = Depends(oauth2_scheme_optional),
     db: Session = Depends(get_db)
-) -> Optional[models.User]:
+) -> Optional[Principal]:
     """Get current user if authenticated, otherwise None."""
     if not token:
         return None
@@ -1,7 +1,11 @@
-"""Azure Blob Storage utility for file uploads."""
+"""
+Azure Blob Storage utility for file uploads.
+
+The Azure SDK is imported on first use so that workers which never touch
+uploads (or run without AZURE_STORAGE_CONNECTION_STRING) don't pay for it.
+"""
 import os
 from typing import Optional, BinaryIO
-from azure.storage.blob import BlobServiceClient, ContentSettings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,11 +15,12 @@ AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING", "
 AZURE_STORAGE_CONTAINER_NAME = os.getenv("AZURE_STORAGE_CONTAINER_NAME", "uploads")
 
 
-def get_blob_service_client() -> Optional[BlobServiceClient]:
+def get_blob_service_client():
     """Get Azure Blob Service client."""
     if not AZURE_STORAGE_CONNECTION_STRING:
         return None
     try:
+        from azure.storage.blob import BlobServiceClient
         return BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
     except Exception as e:
         print(f"Error connecting to Azure Blob Storage: {e}")
@@ -63,6 +68,8 @@ def upload_file(
         return None
     
     try:
+        from azure.storage.blob import ContentSettings
+
         # Set content settings for proper file serving
         content_settings = ContentSettings(content_type=content_type)
         
@@ -0,0 +1,171 @@
+"""Small in-process caches used to keep hot reads off the database."""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an optional per-entry TTL.
+
+    Invalidating a key bumps that key's generation (clear bumps a cache-wide
+    one); get_or_load only stores a freshly loaded value if its key was not
+    invalidated while it was loading, so a slow read can never overwrite the
+    cache with pre-invalidation data, while invalidations of other keys leave
+    it alone. Per-key generations are only kept while a load of the key is in
+    flight.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._key_generations: "dict[Hashable, int]" = {}
+        self._loading: "dict[Hashable, int]" = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _invalidate(self, key: Hashable) -> None:
+        # Caller holds the lock; only in-flight loads need to see the bump
+        if key in self._loading:
+            self._key_generations[key] = self._key_generations.get(key, 0) + 1
+
+    def pop(self, key: Hashable) -> None:
+        """Invalidate a single entry."""
+        with self._lock:
+            self._invalidate(key)
+            self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Invalidate every entry whose key matches `predicate` (a full scan)."""
+        with self._lock:
+            for key in [key for key in self._loading if predicate(key)]:
+                self._invalidate(key)
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        """Invalidate every entry."""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value, calling loader() and caching its result on a miss."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            self._loading[key] = self._loading.get(key, 0) + 1
+            generation = (self._generation, self._key_generations.get(key, 0))
+        try:
+            value = loader()
+            with self._lock:
+                if (self._generation, self._key_generations.get(key, 0)) == generation:
+                    self._store(key, value)
+        finally:
+            with self._lock:
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    self._key_generations.pop(key, None)
+        return value
+
+    def update(self, key: Hashable, func: Callable[[Any], Any]) -> None:
+        """
+        Replace a cached value with func(value), if it is cached.
+
+        Counts as an invalidation, so a load already in flight (which may
+        predate the change) is not stored over the updated value.
+        """
+        with self._lock:
+            self._invalidate(key)
+            entry = self._data.get(key)
+            if entry is None:
+                return
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return
+            self._data[key] = (func(value), expires)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class IntSet:
+    """
+    Immutable set of integers stored as a sorted typed array.
+
+    Uses 8 bytes per member instead of a set's hash table and boxed ints;
+    membership is a binary search. add/discard return a new IntSet, so a
+    cached instance can be read without locking.
+    """
+    __slots__ = ("_items",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._items = array("q", sorted(set(values)))
+
+    @classmethod
+    def _from_array(cls, items: array) -> "IntSet":
+        instance = cls.__new__(cls)
+        instance._items = items
+        return instance
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect_left(self._items, value)
+        return i < len(self._items) and self._items[i] == value
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._items)
+
+    def add(self, value: int) -> "IntSet":
+        i = bisect_left(self._items, value)
+        if i < len(self._items) and self._items[i] == value:
+            return self
+        items = array("q", self._items)
+        items.insert(i, value)
+        return self._from_array(items)
+
+    def discard(self, value: int) -> "IntSet":
+        i = bisect_left(self._items, value)
+        if i == len(self._items) or self._items[i] != value:
+            return self
+        items = array("q", self._items)
+        del items[i]
+        return self._from_array(items)
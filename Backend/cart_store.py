@@ -0,0 +1,355 @@
+"""
+Cart storage backends.
+
+SqlCartStore reads and writes cart_items directly through crud.
+MemoryCartStore keeps carts in process memory and writes them behind to
+cart_items in batches, taking cart writes off the request path. It is only
+safe when a single process owns the carts (one worker or sticky sessions).
+Select the backend with CART_STORE=sql|memory.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import crud, models, schemas
+
+CART_STORE_BACKEND = os.getenv("CART_STORE", "sql").lower()
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "1.0"))
+CART_FLUSH_BATCH = int(os.getenv("CART_FLUSH_BATCH", "500"))
+CART_STORE_MAX_USERS = int(os.getenv("CART_STORE_MAX_USERS", "100000"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CartLine:
+    """An in-memory cart line exposing the CartItem attributes the API reads."""
+    product_id: int
+    quantity: int
+    product: Optional[models.Product] = None
+    id: Optional[int] = None
+
+
+class CartStore:
+    """Interface used by the cart router and checkout to read and change carts."""
+
+    def get_items(self, db: Session, user_id: int) -> list:
+        raise NotImplementedError
+
+    def get_total(self, db: Session, user_id: int) -> float:
+        raise NotImplementedError
+
+    def get_summary(self, db: Session, user_id: int) -> schemas.CartSummary:
+        raise NotImplementedError
+
+    def add(self, db: Session, user_id: int, product_id: int, quantity: int):
+        raise NotImplementedError
+
+    def set_quantity(self, db: Session, user_id: int, product_id: int, quantity: int):
+        """Set a line's quantity; <= 0 removes it. Returns None if the line is gone."""
+        raise NotImplementedError
+
+    def remove(self, db: Session, user_id: int, product_id: int) -> bool:
+        raise NotImplementedError
+
+    def clear(self, db: Session, user_id: int) -> None:
+        raise NotImplementedError
+
+    def bulk_update(self, db: Session, user_id: int, changes: schemas.CartBulkUpdate) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release resources and persist anything still pending."""
+
+
+class SqlCartStore(CartStore):
+    """Cart store backed directly by the cart_items table."""
+
+    def get_items(self, db, user_id):
+        return crud.get_cart_items(db, user_id)
+
+    def get_total(self, db, user_id):
+        return crud.get_cart_total(db, user_id)
+
+    def get_summary(self, db, user_id):
+        return crud.get_cart_summary(db, user_id)
+
+    def add(self, db, user_id, product_id, quantity):
+        item = schemas.CartItemCreate(product_id=product_id, quantity=quantity)
+        return crud.add_to_cart(db, user_id, item)
+
+    def set_quantity(self, db, user_id, product_id, quantity):
+        return crud.update_cart_item(db, user_id, product_id, quantity)
+
+    def remove(self, db, user_id, product_id):
+        return crud.remove_from_cart(db, user_id, product_id)
+
+    def clear(self, db, user_id):
+        crud.clear_cart(db, user_id)
+
+    def bulk_update(self, db, user_id, changes):
+        crud.bulk_update_cart(db, user_id, changes)
+
+
+class _Cart:
+    __slots__ = ("lines", "version")
+
+    def __init__(self, lines: Dict[int, int]):
+        self.lines = lines  # product_id -> quantity
+        self.version = 0
+
+
+class MemoryCartStore(CartStore):
+    """
+    Memory-first cart store with write-behind persistence.
+
+    Carts are loaded from cart_items on first access and then served from
+    memory. Mutations mark the cart dirty; a background thread replaces the
+    dirty carts' rows in batches. Checkout reads the in-memory cart, which is
+    always the latest state. Only clean carts are evicted.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        flush_interval: Optional[float] = CART_FLUSH_INTERVAL,
+        flush_batch: int = CART_FLUSH_BATCH,
+        max_users: int = CART_STORE_MAX_USERS
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_users = max_users
+        self._carts: "OrderedDict[int, _Cart]" = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # Loading and eviction
+    def _with_cart(self, db: Session, user_id: int, func):
+        """
+        Run func(cart) under the lock, loading the cart first on a miss.
+
+        The lookup (or install) and func share one lock acquisition, so the
+        cart cannot be evicted between being found and being used.
+        """
+        with self._lock:
+            cart = self._carts.get(user_id)
+            if cart is not None:
+                self._carts.move_to_end(user_id)
+                return func(cart)
+
+        rows = db.query(models.CartItem.product_id, models.CartItem.quantity).filter(
+            models.CartItem.user_id == user_id
+        ).all()
+
+        with self._lock:
+            # Another request may have loaded (and changed) it meanwhile
+            cart = self._carts.get(user_id)
+            if cart is None:
+                cart = _Cart({product_id: quantity for product_id, quantity in rows})
+                self._carts[user_id] = cart
+            result = func(cart)
+            self._evict()
+            return result
+
+    def _load(self, db: Session, user_id: int) -> _Cart:
+        return self._with_cart(db, user_id, lambda cart: cart)
+
+    def _evict(self) -> None:
+        for user_id in list(self._carts):
+            if len(self._carts) <= self.max_users:
+                break
+            if user_id not in self._dirty:
+                del self._carts[user_id]
+
+    def _mutate(self, db: Session, user_id: int, apply):
+        def change(cart: _Cart):
+            result = apply(cart.lines)
+            cart.version += 1
+            self._dirty.add(user_id)
+            return result
+
+        result = self._with_cart(db, user_id, change)
+        crud.cart_summary_cache.pop(user_id)
+        self._ensure_flusher()
+        return result
+
+    # CartStore interface
+    def get_items(self, db, user_id):
+        cart = self._load(db, user_id)
+        with self._lock:
+            lines = dict(cart.lines)
+        products = crud.get_products_by_ids(db, list(lines))
+        return [
+            CartLine(product_id=product_id, quantity=quantity, product=products[product_id])
+            for product_id, quantity in lines.items() if product_id in products
+        ]
+
+    def get_total(self, db, user_id):
+        return sum(line.product.price * line.quantity for line in self.get_items(db, user_id))
+
+    def get_summary(self, db, user_id):
+        def load():
+            items = self.get_items(db, user_id)
+            return schemas.CartSummary(
+                count=len(items),
+                quantity=sum(line.quantity for line in items),
+                total=sum(line.product.price * line.quantity for line in items)
+            )
+        return crud.cart_summary_cache.get_or_load(user_id, load)
+
+    def add(self, db, user_id, product_id, quantity):
+        def apply(lines):
+            lines[product_id] = lines.get(product_id, 0) + quantity
+            return lines[product_id]
+        total_quantity = self._mutate(db, user_id, apply)
+        return CartLine(product_id=product_id, quantity=total_quantity, product=db.get(models.Product, product_id))
+
+    def set_quantity(self, db, user_id, product_id, quantity):
+        cart = self._load(db, user_id)
+        if product_id not in cart.lines:
+            return None
+        if quantity <= 0:
+            self.remove(db, user_id, product_id)
+            return None
+        self._mutate(db, user_id, lambda lines: lines.__setitem__(product_id, quantity))
+        return CartLine(product_id=product_id, quantity=quantity, product=db.get(models.Product, product_id))
+
+    def remove(self, db, user_id, product_id):
+        cart = self._load(db, user_id)
+        if product_id not in cart.lines:
+            return False
+        self._mutate(db, user_id, lambda lines: lines.pop(product_id, None))
+        return True
+
+    def clear(self, db, user_id):
+        self._mutate(db, user_id, lambda lines: lines.clear())
+
+    def bulk_update(self, db, user_id, changes):
+        def apply(lines):
+            for product_id in changes.remove:
+                lines.pop(product_id, None)
+            for line in changes.set:
+                if line.quantity <= 0:
+                    lines.pop(line.product_id, None)
+                else:
+                    lines[line.product_id] = line.quantity
+            for line in changes.increment:
+                lines[line.product_id] = lines.get(line.product_id, 0) + line.quantity
+        self._mutate(db, user_id, apply)
+
+    # Write-behind
+    def _write(self, db: Session, snapshot: Dict[int, tuple]) -> None:
+        """Replace the cart_items rows of the snapshotted carts and commit."""
+        product_ids = {product_id for lines, _ in snapshot.values() for product_id in lines}
+        # Lines for products deleted since they were added would break the foreign key
+        existing = set(db.scalars(select(models.Product.id).where(models.Product.id.in_(product_ids))))
+        rows = [
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+            for user_id, (lines, _) in snapshot.items()
+            for product_id, quantity in lines.items() if product_id in existing
+        ]
+        db.execute(delete(models.CartItem).where(models.CartItem.user_id.in_(list(snapshot))))
+        if rows:
+            db.execute(insert(models.CartItem), rows)
+        db.commit()
+
+    def flush(self) -> int:
+        """Persist one batch of dirty carts. Returns the number of carts written."""
+        with self._lock:
+            snapshot = {}
+            for user_id in list(self._dirty)[:self.flush_batch]:
+                cart = self._carts.get(user_id)
+                if cart is None:
+                    self._dirty.discard(user_id)
+                    continue
+                snapshot[user_id] = (dict(cart.lines), cart.version)
+        if not snapshot:
+            return 0
+
+        written = {}
+        db = self.session_factory()
+        try:
+            try:
+                self._write(db, snapshot)
+                written = snapshot
+            except Exception:
+                db.rollback()
+                # Retry cart by cart so one bad cart cannot hold back the batch
+                for user_id, entry in snapshot.items():
+                    try:
+                        self._write(db, {user_id: entry})
+                        written[user_id] = entry
+                    except Exception:
+                        db.rollback()
+                        logger.exception("Error flushing cart for user %s", user_id)
+        finally:
+            db.close()
+
+        with self._lock:
+            for user_id, (_, version) in written.items():
+                cart = self._carts.get(user_id)
+                # Changed again while we were writing: leave it dirty
+                if cart is not None and cart.version == version:
+                    self._dirty.discard(user_id)
+        return len(written)
+
+    def flush_all(self) -> None:
+        """Flush until no dirty carts remain (or nothing more can be written)."""
+        while self.flush():
+            pass
+
+    def pending(self) -> int:
+        """Number of carts waiting to be written."""
+        with self._lock:
+            return len(self._dirty)
+
+    def _ensure_flusher(self) -> None:
+        if self.flush_interval is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cart-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush_all()
+            except Exception:
+                # Keep the flusher alive; dirty carts are retried next interval
+                logger.exception("Cart flusher iteration failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush_all()
+
+
+_store: Optional[CartStore] = None
+
+
+def get_cart_store() -> CartStore:
+    """Dependency returning the configured cart store."""
+    global _store
+    if _store is None:
+        _store = MemoryCartStore() if CART_STORE_BACKEND == "memory" else SqlCartStore()
+    return _store
+
+
+def close_cart_store() -> None:
+    """Flush and shut down the cart store, if one was created."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
@@ -1,21 +1,60 @@
 """CRUD operations for all models."""
-from sqlalchemy.orm import Session
-from sqlalchemy import distinct
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import distinct, func, select, update, delete, insert, text, or_, and_
+from sqlalchemy.dialects import sqlite, postgresql
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+import json
+import os
 import models, schemas
+import outbox
+import rollups
+from archive import archive_horizon
+from cache import IntSet, LRUCache
+
+# Per-user cart badge summaries; the TTL bounds staleness across workers
+cart_summary_cache = LRUCache(
+    maxsize=int(os.getenv("CART_SUMMARY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CART_SUMMARY_TTL", "30"))
+)
+
+# Per-user wishlisted product IDs for membership checks; updated in place on
+# add/remove, the TTL bounds staleness across workers
+wishlist_ids_cache = LRUCache(
+    maxsize=int(os.getenv("WISHLIST_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("WISHLIST_CACHE_TTL", "300"))
+)
 
 
 # Product CRUD
-def get_products(db: Session, skip: int = 0, limit: int = 100) -> List[models.Product]:
-    return db.query(models.Product).offset(skip).limit(limit).all()
+def _sorted_products(query, sort: Optional[str]):
+    if sort == "wishlisted":
+        # Both descending so the (wishlist_count, id) index is scanned backwards
+        return query.order_by(models.Product.wishlist_count.desc(), models.Product.id.desc())
+    return query
+
+
+def get_products(db: Session, skip: int = 0, limit: int = 100, sort: Optional[str] = None) -> List[models.Product]:
+    return _sorted_products(db.query(models.Product), sort).offset(skip).limit(limit).all()
 
 
 def get_product(db: Session, product_id: int) -> Optional[models.Product]:
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
 
-def get_products_by_category(db: Session, category: str) -> List[models.Product]:
-    return db.query(models.Product).filter(models.Product.category == category).all()
+def get_products_by_ids(db: Session, product_ids: List[int]) -> Dict[int, models.Product]:
+    """Resolve many products with a single IN query, keyed by ID."""
+    if not product_ids:
+        return {}
+    products = db.query(models.Product).filter(models.Product.id.in_(set(product_ids))).all()
+    return {product.id: product for product in products}
+
+
+def get_products_by_category(db: Session, category: str, sort: Optional[str] = None) -> List[models.Product]:
+    return _sorted_products(
+        db.query(models.Product).filter(models.Product.category == category), sort
+    ).all()
 
 
 def get_categories(db: Session) -> List[str]:
@@ -40,6 +79,7 @@ def update_product(db: Session, product_id: int, product: schemas.ProductUpdate)
             setattr(db_product, key, value)
         db.commit()
         db.refresh(db_product)
+        cart_summary_cache.clear()
     return db_product
 
 
@@ -48,6 +88,8 @@ def delete_product(db: Session, product_id: int) -> bool:
     if db_product:
         db.delete(db_product)
         db.commit()
+        cart_summary_cache.clear()
+        wishlist_ids_cache.clear()  # Its wishlist rows were deleted with it
         return True
     return False
 
@@ -75,43 +117,144 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]
 
 # Cart CRUD
 def get_cart_items(db: Session, user_id: int) -> List[models.CartItem]:
-    return db.query(models.CartItem).filter(models.CartItem.user_id == user_id).all()
-
-
-def add_to_cart(db: Session, user_id: int, item: schemas.CartItemCreate) -> models.CartItem:
-    # Check if item already in cart
+    # Products are joined in the same query so serializing the cart is N+1 free
+    return db.query(models.CartItem).options(
+        joinedload(models.CartItem.product)
+    ).filter(models.CartItem.user_id == user_id).all()
+
+
+def get_cart_total(db: Session, user_id: int) -> float:
+    """Sum price * quantity for a user's cart in SQL."""
+    total = db.query(
+        func.sum(models.Product.price * models.CartItem.quantity)
+    ).select_from(models.CartItem).join(
+        models.Product, models.CartItem.product_id == models.Product.id
+    ).filter(models.CartItem.user_id == user_id).scalar()
+    return float(total or 0.0)
+
+
+def get_cart_summary(db: Session, user_id: int) -> schemas.CartSummary:
+    """Line count, total quantity and total price for a cart, cached per user."""
+    def load() -> schemas.CartSummary:
+        count, quantity, total = db.query(
+            func.count(models.CartItem.id),
+            func.sum(models.CartItem.quantity),
+            func.sum(models.Product.price * models.CartItem.quantity)
+        ).select_from(models.CartItem).join(
+            models.Product, models.CartItem.product_id == models.Product.id
+        ).filter(models.CartItem.user_id == user_id).one()
+        return schemas.CartSummary(count=count, quantity=quantity or 0, total=float(total or 0.0))
+
+    return cart_summary_cache.get_or_load(user_id, load)
+
+
+_CART_MERGE_SQL = """
+MERGE cart_items WITH (HOLDLOCK) AS target
+USING (SELECT :user_id AS user_id, :product_id AS product_id, :quantity AS quantity) AS source
+ON target.user_id = source.user_id AND target.product_id = source.product_id
+WHEN MATCHED THEN UPDATE SET quantity = {matched_quantity}
+WHEN NOT MATCHED THEN INSERT (user_id, product_id, quantity)
+    VALUES (source.user_id, source.product_id, source.quantity)
+{output};
+"""
+
+
+def _cart_item_filter(user_id: int, product_id: int):
+    return (models.CartItem.user_id == user_id) & (models.CartItem.product_id == product_id)
+
+
+def _cart_merge_sql(increment: bool, returning: bool = False) -> str:
+    """SQL Server MERGE for one cart line, optionally echoing the row back."""
+    return _CART_MERGE_SQL.format(
+        matched_quantity="target.quantity + source.quantity" if increment else "source.quantity",
+        output="OUTPUT inserted.id, inserted.user_id, inserted.product_id, inserted.quantity"
+        if returning else ""
+    )
+
+
+def _cart_on_conflict(dialect: str, rows: List[dict], increment: bool):
+    """INSERT ... ON CONFLICT DO UPDATE for one or many cart lines (SQLite/Postgres)."""
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    stmt = insert(models.CartItem).values(rows)
+    quantity = stmt.excluded.quantity
+    if increment:
+        quantity = models.CartItem.quantity + quantity
+    return stmt.on_conflict_do_update(
+        index_elements=[models.CartItem.user_id, models.CartItem.product_id],
+        set_={"quantity": quantity}
+    )
+
+
+def _upsert_cart_row_fallback(db: Session, row: dict, increment: bool) -> models.CartItem:
+    """Read-then-write upsert for dialects without a native one."""
     existing = db.query(models.CartItem).filter(
-        models.CartItem.user_id == user_id,
-        models.CartItem.product_id == item.product_id
+        _cart_item_filter(row["user_id"], row["product_id"])
     ).first()
-    
     if existing:
-        existing.quantity += item.quantity
-        db.commit()
-        db.refresh(existing)
+        existing.quantity = existing.quantity + row["quantity"] if increment else row["quantity"]
+        db.flush()
         return existing
-    
-    db_item = models.CartItem(user_id=user_id, **item.model_dump())
+    db_item = models.CartItem(**row)
     db.add(db_item)
+    db.flush()
+    return db_item
+
+
+def _upsert_cart_item(db: Session, user_id: int, product_id: int, quantity: int) -> models.CartItem:
+    """Insert a cart line or add to its quantity in a single statement."""
+    dialect = db.get_bind().dialect.name
+    values = {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+    params = None
+
+    if dialect in ("sqlite", "postgresql"):
+        stmt = _cart_on_conflict(dialect, [values], increment=True).returning(models.CartItem)
+    elif dialect == "mssql":
+        stmt = select(models.CartItem).from_statement(text(_cart_merge_sql(True, returning=True)))
+        params = values
+    else:
+        return _upsert_cart_row_fallback(db, values, increment=True)
+
+    return db.scalars(
+        stmt, params,
+        execution_options={"populate_existing": True}
+    ).one()
+
+
+def _upsert_cart_lines(db: Session, rows: List[dict], increment: bool) -> None:
+    """Upsert many cart lines, batched into one statement where the dialect allows."""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        db.execute(_cart_on_conflict(dialect, rows, increment))
+    elif dialect == "mssql":
+        db.execute(text(_cart_merge_sql(increment)), rows)
+    else:
+        for row in rows:
+            _upsert_cart_row_fallback(db, row, increment)
+
+
+def add_to_cart(db: Session, user_id: int, item: schemas.CartItemCreate) -> models.CartItem:
+    db_item = _upsert_cart_item(db, user_id, item.product_id, item.quantity)
     db.commit()
-    db.refresh(db_item)
+    cart_summary_cache.pop(user_id)
     return db_item
 
 
 def update_cart_item(db: Session, user_id: int, product_id: int, quantity: int) -> Optional[models.CartItem]:
-    item = db.query(models.CartItem).filter(
-        models.CartItem.user_id == user_id,
-        models.CartItem.product_id == product_id
-    ).first()
-    
-    if item:
-        if quantity <= 0:
-            db.delete(item)
-            db.commit()
-            return None
-        item.quantity = quantity
+    if quantity <= 0:
+        db.execute(delete(models.CartItem).where(_cart_item_filter(user_id, product_id)))
         db.commit()
-        db.refresh(item)
+        cart_summary_cache.pop(user_id)
+        return None
+
+    item = db.scalars(
+        update(models.CartItem)
+        .where(_cart_item_filter(user_id, product_id))
+        .values(quantity=quantity)
+        .returning(models.CartItem),
+        execution_options={"populate_existing": True}
+    ).first()
+    db.commit()
+    cart_summary_cache.pop(user_id)
     return item
 
 
@@ -124,6 +267,7 @@ def remove_from_cart(db: Session, user_id: int, product_id: int) -> bool:
     if item:
         db.delete(item)
         db.commit()
+        cart_summary_cache.pop(user_id)
         return True
     return False
 
@@ -131,47 +275,489 @@ def remove_from_cart(db: Session, user_id: int, product_id: int) -> bool:
 def clear_cart(db: Session, user_id: int) -> None:
     db.query(models.CartItem).filter(models.CartItem.user_id == user_id).delete()
     db.commit()
+    cart_summary_cache.pop(user_id)
+
+
+def bulk_update_cart(db: Session, user_id: int, changes: schemas.CartBulkUpdate) -> None:
+    """Apply many cart changes in one transaction, one statement per kind of change."""
+    remove_ids = list(changes.remove) + [line.product_id for line in changes.set if line.quantity <= 0]
+    set_rows = [
+        {"user_id": user_id, "product_id": line.product_id, "quantity": line.quantity}
+        for line in changes.set if line.quantity > 0
+    ]
+    increment_rows = [
+        {"user_id": user_id, "product_id": line.product_id, "quantity": line.quantity}
+        for line in changes.increment
+    ]
+
+    if remove_ids:
+        db.execute(delete(models.CartItem).where(
+            models.CartItem.user_id == user_id,
+            models.CartItem.product_id.in_(remove_ids)
+        ))
+    if set_rows:
+        _upsert_cart_lines(db, set_rows, increment=False)
+    if increment_rows:
+        _upsert_cart_lines(db, increment_rows, increment=True)
+    db.commit()
+    cart_summary_cache.pop(user_id)
 
 
 # Order CRUD
-def create_order(db: Session, user_id: int, items: List[schemas.OrderItemBase]) -> models.Order:
-    # Create order
-    db_order = models.Order(user_id=user_id)
+class InsufficientStockError(Exception):
+    """Raised when one or more order lines cannot be reserved."""
+
+    def __init__(self, failures: List[schemas.StockFailure]):
+        self.failures = failures
+        super().__init__("Insufficient stock for products " + ", ".join(str(f.product_id) for f in failures))
+
+
+def _reserve_stock(db: Session, lines, products: Dict[int, models.Product]) -> List[schemas.StockFailure]:
+    """
+    Decrement tracked stock with conditional UPDATEs inside the caller's transaction.
+
+    Each product gets one `UPDATE ... WHERE stock >= qty`; the row lock taken
+    by the update is the only serialization, so no global lock is needed.
+    Returns the lines that could not be reserved.
+    """
+    requested: Dict[int, int] = {}
+    for item, product in lines:
+        if product.stock is not None:
+            requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    return _reserve_quantities(db, requested)
+
+
+def _reserve_quantities(db: Session, requested: Dict[int, int]) -> List[schemas.StockFailure]:
+    """Take `requested` units per tracked product; returns the products that fell short."""
+    failed = []
+    # Fixed order keeps concurrent checkouts from deadlocking each other
+    for product_id in sorted(requested):
+        quantity = requested[product_id]
+        result = db.execute(
+            update(models.Product)
+            .where(models.Product.id == product_id, models.Product.stock >= quantity)
+            .values(stock=models.Product.stock - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            failed.append(product_id)
+
+    if not failed:
+        return []
+    available = dict(db.query(models.Product.id, models.Product.stock).filter(models.Product.id.in_(failed)).all())
+    return [
+        schemas.StockFailure(product_id=product_id, requested=requested[product_id], available=available.get(product_id) or 0)
+        for product_id in failed
+    ]
+
+
+def create_order(
+    db: Session,
+    user_id: int,
+    items: List[schemas.OrderItemBase],
+    products: Optional[Dict[int, models.Product]] = None
+) -> models.Order:
+    """
+    Create an order in a constant number of statements.
+
+    Products are resolved with one IN query (or taken from `products` when the
+    caller already loaded them), and prices and the total come from that one
+    snapshot. Items for unknown products are skipped. Tracked stock is
+    reserved in the same transaction; if any line falls short nothing is
+    written and InsufficientStockError lists the failing lines. Raises
+    ValueError for a quantity below 1.
+    """
+    # A negative line would turn the stock reservation into a restock
+    if any(item.quantity < 1 for item in items):
+        raise ValueError("Order item quantities must be at least 1")
+    if products is None:
+        products = get_products_by_ids(db, [item.product_id for item in items])
+
+    lines = [(item, products[item.product_id]) for item in items if item.product_id in products]
+    total = sum(product.price * item.quantity for item, product in lines)
+
+    failures = _reserve_stock(db, lines, products)
+    if failures:
+        db.rollback()
+        raise InsufficientStockError(failures)
+
+    # Stamped here so the order and its sales rollup agree on the day
+    db_order = models.Order(user_id=user_id, total=total, created_at=datetime.now(timezone.utc))
     db.add(db_order)
     db.flush()  # Get order ID
-    
-    total = 0.0
-    for item in items:
-        product = get_product(db, item.product_id)
-        if product:
-            order_item = models.OrderItem(
-                order_id=db_order.id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price=product.price
-            )
-            db.add(order_item)
-            total += product.price * item.quantity
-    
-    db_order.total = total
+
+    if lines:
+        db.execute(insert(models.OrderItem).values([
+            {
+                "order_id": db_order.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price": product.price,
+                "category": product.category
+            }
+            for item, product in lines
+        ]))
+        rollups.record_order(db, db_order.created_at.date(), [
+            (item.product_id, product.category, item.quantity, product.price)
+            for item, product in lines
+        ])
+
+    outbox.enqueue(db, "order", db_order.id, "order.created", {
+        "order_id": db_order.id,
+        "user_id": user_id,
+        "total": total,
+        "lines": len(lines)
+    })
     db.commit()
     db.refresh(db_order)
     return db_order
 
 
-def get_orders(db: Session, user_id: int) -> List[models.Order]:
-    return db.query(models.Order).filter(models.Order.user_id == user_id).all()
+# Idempotency key CRUD
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+# How long an in-progress claim is honoured before a retry may take it over;
+# must comfortably exceed the time it takes to place an order
+IDEMPOTENCY_LEASE = timedelta(seconds=float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30")))
+
+
+def idempotency_lease_expired(record: models.IdempotencyKey, now: Optional[datetime] = None) -> bool:
+    """True if an in-progress claim's owner has stopped holding it."""
+    return record.status == "in_progress" and (
+        record.locked_until is None or record.locked_until < (now or datetime.utcnow())
+    )
+
+
+def get_idempotency_key(db: Session, user_id: int, key: str) -> Optional[models.IdempotencyKey]:
+    # populate_existing so callers polling for completion see fresh values
+    return db.query(models.IdempotencyKey).filter(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key
+    ).populate_existing().first()
+
+
+def claim_idempotency_key(db: Session, user_id: int, key: str, fingerprint: str) -> Optional[models.IdempotencyKey]:
+    """
+    Record `key` as in progress for this user.
+
+    Returns None when the caller now owns the key, otherwise the existing
+    record (in progress or completed). Expired records are replaced, and an
+    in-progress claim for the same request whose lease has lapsed (its owner
+    died or could not record the response) is taken over.
+    """
+    for _ in range(3):
+        now = datetime.utcnow()
+        db.add(models.IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            locked_until=now + IDEMPOTENCY_LEASE,
+            created_at=now,
+            expires_at=now + IDEMPOTENCY_TTL
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        existing = get_idempotency_key(db, user_id, key)
+        if existing is None:
+            continue  # released between our insert and read
+        if existing.fingerprint == fingerprint and idempotency_lease_expired(existing, now):
+            # Conditional, so only one of several retries wins the takeover
+            taken = db.execute(update(models.IdempotencyKey).where(
+                models.IdempotencyKey.id == existing.id,
+                models.IdempotencyKey.status == "in_progress",
+                or_(models.IdempotencyKey.locked_until.is_(None), models.IdempotencyKey.locked_until < now)
+            ).values(locked_until=now + IDEMPOTENCY_LEASE))
+            db.commit()
+            if taken.rowcount == 1:
+                return None
+            continue
+        if existing.expires_at >= now:
+            return existing
+        db.delete(existing)
+        db.commit()
+    raise RuntimeError(f"Could not claim idempotency key {key!r}")
+
+
+def complete_idempotency_key(db: Session, user_id: int, key: str, status_code: int, body) -> None:
+    db.execute(update(models.IdempotencyKey).where(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key
+    ).values(status="completed", response_status=status_code, response_body=json.dumps(body)))
+    db.commit()
+
+
+def release_idempotency_key(db: Session, user_id: int, key: str) -> None:
+    """Forget an in-progress key so a failed request can be retried."""
+    db.execute(delete(models.IdempotencyKey).where(
+        models.IdempotencyKey.user_id == user_id,
+        models.IdempotencyKey.key == key,
+        models.IdempotencyKey.status == "in_progress"
+    ))
+    db.commit()
+
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    result = db.execute(delete(models.IdempotencyKey).where(
+        models.IdempotencyKey.expires_at < datetime.utcnow()
+    ))
+    db.commit()
+    return result.rowcount
+
+
+def _with_items(query, order_model=models.Order, item_model=models.OrderItem):
+    # Items and their products in two extra queries, however many orders
+    return query.options(
+        selectinload(order_model.items).selectinload(item_model.product)
+    )
+
+
+def _order_page(db: Session, order_model, item_model, user_id: int, limit: Optional[int], cursor: Optional[int]):
+    query = db.query(order_model).filter(order_model.user_id == user_id)
+    if cursor is not None:
+        # The cursor order may live in either table
+        cursor_created = func.coalesce(
+            select(models.Order.created_at).where(models.Order.id == cursor).scalar_subquery(),
+            select(models.ArchivedOrder.created_at).where(models.ArchivedOrder.id == cursor).scalar_subquery()
+        )
+        query = query.filter(or_(
+            order_model.created_at < cursor_created,
+            and_(order_model.created_at == cursor_created, order_model.id < cursor)
+        ))
+    query = _with_items(query, order_model, item_model).order_by(order_model.created_at.desc(), order_model.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def get_orders(
+    db: Session,
+    user_id: int,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None
+) -> List[models.Order]:
+    """
+    Orders for a user, newest first, keyset-paginated on (created_at, id).
+
+    `cursor` is the ID of the last order on the previous page. The cursor
+    row's created_at is compared in SQL so stored timestamp formats never
+    leak into the comparison.
+
+    The hot table is read first. Archived orders are all older than the
+    archive horizon, so the archive is only read when the hot page is short
+    or reaches past the horizon; the two pages are then merged.
+    """
+    hot = _order_page(db, models.Order, models.OrderItem, user_id, limit, cursor)
+    if limit is not None and len(hot) == limit and _naive_utc(hot[-1].created_at) >= archive_horizon():
+        return hot
+
+    cold = _order_page(db, models.ArchivedOrder, models.ArchivedOrderItem, user_id, limit, cursor)
+    if not cold:
+        return hot
+    merged = sorted(hot + cold, key=lambda order: (_naive_utc(order.created_at), order.id), reverse=True)
+    return merged[:limit] if limit is not None else merged
+
+
+def _get_hot_order(db: Session, order_id: int) -> Optional[models.Order]:
+    return _with_items(db.query(models.Order)).filter(models.Order.id == order_id).first()
+
+
+def get_order(db: Session, order_id: int):
+    """Look an order up in the hot table, falling back to the archive."""
+    order = _get_hot_order(db, order_id)
+    if order is None:
+        order = _with_items(
+            db.query(models.ArchivedOrder), models.ArchivedOrder, models.ArchivedOrderItem
+        ).filter(models.ArchivedOrder.id == order_id).first()
+    return order
 
 
-def get_order(db: Session, order_id: int) -> Optional[models.Order]:
-    return db.query(models.Order).filter(models.Order.id == order_id).first()
+def _move_stock(db: Session, orders: List[models.Order], cancelled: bool) -> None:
+    """
+    Return the orders' units to tracked stock when they are cancelled, or
+    reserve them again when they leave cancelled. A re-reservation that falls
+    short rolls back and raises InsufficientStockError, as create_order does.
+    """
+    quantities: Dict[int, int] = {}
+    for order in orders:
+        for item in order.items:
+            if item.product is not None and item.product.stock is not None:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    if not cancelled:
+        failures = _reserve_quantities(db, quantities)
+        if failures:
+            db.rollback()
+            raise InsufficientStockError(failures)
+        return
+    # Same fixed order as reservations, so restocks and checkouts don't deadlock
+    for product_id in sorted(quantities):
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id == product_id, models.Product.stock.isnot(None))
+            .values(stock=models.Product.stock + quantities[product_id])
+            .execution_options(synchronize_session=False)
+        )
 
 
 def update_order_status(db: Session, order_id: int, status: str) -> Optional[models.Order]:
-    order = get_order(db, order_id)
-    if order:
-        order.status = status
-        db.commit()
-        db.refresh(order)
+    """
+    Change one hot order's status. Cancelling returns its stock; leaving
+    cancelled reserves it again and raises InsufficientStockError on a shortfall.
+    """
+    # Archived orders are read-only
+    order = _get_hot_order(db, order_id)
+    if order is None or order.status == status:
+        return order
+
+    # Conditional on the status we read, so racing updates count the change once
+    previous = order.status
+    changed = db.execute(
+        update(models.Order)
+        .where(models.Order.id == order_id, models.Order.status == previous)
+        .values(status=status)
+    ).rowcount
+    if changed and (previous == "cancelled") != (status == "cancelled"):
+        _move_stock(db, [order], status == "cancelled")
+        sign = -1 if status == "cancelled" else 1
+        rollups.record_order(db, order.created_at.date(), rollups.order_lines(order), sign)
+    db.commit()
+    db.refresh(order)
     return order
 
+
+def bulk_update_order_status(db: Session, order_ids: List[int], expected_status: str, status: str) -> List[int]:
+    """
+    Move every order in `order_ids` that is still in `expected_status` to
+    `status` with one conditional UPDATE. Returns the IDs that changed.
+
+    Stock moves as in update_order_status; if the orders leaving cancelled
+    cannot all be reserved again, none of them change.
+    """
+    ids = sorted(set(order_ids))
+    condition = and_(models.Order.id.in_(ids), models.Order.status == expected_status)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        updated = db.scalars(
+            update(models.Order).where(condition).values(status=status).returning(models.Order.id)
+        ).all()
+    else:
+        updated = db.scalars(select(models.Order.id).where(condition).with_for_update()).all()
+        if updated:
+            db.execute(update(models.Order).where(models.Order.id.in_(updated)).values(status=status))
+
+    if updated and (expected_status == "cancelled") != (status == "cancelled"):
+        orders = _with_items(db.query(models.Order)).filter(models.Order.id.in_(updated)).all()
+        _move_stock(db, orders, status == "cancelled")
+        rollups.record_orders(db, orders, -1 if status == "cancelled" else 1)
+    db.commit()
+    return sorted(updated)
+
+
+def get_order_queue(
+    db: Session,
+    status: str,
+    limit: int,
+    cursor: Optional[int] = None
+) -> List[models.Order]:
+    """Hot orders in `status`, oldest first, keyset-paginated on (created_at, id)."""
+    query = db.query(models.Order).filter(models.Order.status == status)
+    if cursor is not None:
+        cursor_created = select(models.Order.created_at).where(models.Order.id == cursor).scalar_subquery()
+        query = query.filter(or_(
+            models.Order.created_at > cursor_created,
+            and_(models.Order.created_at == cursor_created, models.Order.id > cursor)
+        ))
+    return _with_items(query).order_by(
+        models.Order.created_at, models.Order.id
+    ).limit(limit).all()
+
+
+# Wishlist CRUD
+def get_wishlist_ids(db: Session, user_id: int) -> IntSet:
+    """All product IDs in the user's wishlist; one query on a cache miss."""
+    return wishlist_ids_cache.get_or_load(user_id, lambda: IntSet(db.scalars(
+        select(models.Wishlist.product_id).where(models.Wishlist.user_id == user_id)
+    )))
+
+
+def get_wishlisted_ids(db: Session, user_id: int, product_ids: List[int]) -> set:
+    """The subset of `product_ids` in the user's wishlist."""
+    if not product_ids:
+        return set()
+    wishlisted = get_wishlist_ids(db, user_id)
+    return {product_id for product_id in product_ids if product_id in wishlisted}
+
+
+def adjust_wishlist_count(db: Session, product_id: int, delta: int) -> None:
+    """Atomically move a product's wishlist_count in the caller's transaction."""
+    db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(wishlist_count=func.coalesce(models.Product.wishlist_count, 0) + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def wishlist_added(user_id: int, product_id: int) -> None:
+    """Record a committed wishlist add in the cache."""
+    wishlist_ids_cache.update(user_id, lambda ids: ids.add(product_id))
+
+
+def wishlist_removed(user_id: int, product_id: int) -> None:
+    """Record a committed wishlist removal in the cache."""
+    wishlist_ids_cache.update(user_id, lambda ids: ids.discard(product_id))
+
+
+# Review CRUD
+# Sort key columns as (column, descending); the review ID always breaks ties
+REVIEW_SORTS = {
+    "newest": [(models.Review.created_at, True), (models.Review.id, True)],
+    "highest": [(models.Review.rating, True), (models.Review.created_at, True), (models.Review.id, True)],
+    "lowest": [(models.Review.rating, False), (models.Review.created_at, True), (models.Review.id, True)],
+}
+
+
+def _with_author(query):
+    # Authors in one extra query per page, loading only what ReviewAuthor shows
+    return query.options(
+        selectinload(models.Review.user).load_only(models.User.id, models.User.name)
+    )
+
+
+def get_product_reviews(
+    db: Session,
+    product_id: int,
+    sort: str = "newest",
+    limit: int = 20,
+    cursor: Optional[int] = None
+) -> List[models.Review]:
+    """
+    One page of a product's reviews, keyset-paginated on the sort key.
+
+    `cursor` is the ID of the last review on the previous page; its sort
+    values are read in SQL, so each page is an index range scan however many
+    reviews the product has.
+    """
+    keys = REVIEW_SORTS[sort]
+    query = db.query(models.Review).filter(models.Review.product_id == product_id)
+    if cursor is not None:
+        clauses, ties = [], []
+        for column, descending in keys:
+            value = select(column).where(models.Review.id == cursor).scalar_subquery()
+            clauses.append(and_(*ties, column < value if descending else column > value))
+            ties.append(column == value)
+        query = query.filter(or_(*clauses))
+    order_by = [column.desc() if descending else column for column, descending in keys]
+    return _with_author(query).order_by(*order_by).limit(limit).all()
+
+
+def get_user_reviews(db: Session, user_id: int) -> List[models.Review]:
+    return _with_author(db.query(models.Review)).filter(models.Review.user_id == user_id).all()
+
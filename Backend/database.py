@@ -1,11 +1,25 @@
 """Database configuration - SQLite locally, Azure SQL in production."""
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import create_engine, literal, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 # Use DATABASE_URL env var for Azure SQL, fallback to SQLite for local dev
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./store.db")
 
+# How startup manages the schema: "create" (create missing tables when the
+# stored version is stale), "check" (only verify the version) or "skip"
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "create").lower()
+
+# Bump whenever models gain tables, columns or indexes
+SCHEMA_VERSION = 16
+
+# Name/key of the database-level lock that serializes schema setup across workers
+SCHEMA_LOCK_NAME = "store_schema_setup"
+SCHEMA_LOCK_KEY = 7_312_046_118  # pg_advisory_lock takes a bigint
+
 # SQLite needs check_same_thread=False for FastAPI
 if DATABASE_URL.startswith("sqlite"):
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
@@ -24,3 +38,175 @@ def get_db():
     finally:
         db.close()
 
+
+def get_schema_version(bind=None):
+    """Return the schema version stamped in the database, or None if unstamped."""
+    from sqlalchemy import inspect, select
+    import models
+
+    bind = bind or engine
+    if hasattr(bind, "connect"):
+        with bind.connect() as conn:
+            return get_schema_version(conn)
+    if not inspect(bind).has_table(models.SchemaVersion.__tablename__):
+        return None
+    return bind.execute(select(models.SchemaVersion.version)).scalar()
+
+
+@contextmanager
+def _schema_lock(bind):
+    """
+    Yield an autocommit connection holding a database-wide schema setup lock.
+
+    Only one process at a time gets past this; the others wait and then find
+    the schema already current. SQLite has no named locks, so the whole setup
+    runs inside one BEGIN IMMEDIATE transaction, which excludes other writers.
+    """
+    with bind.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        dialect = conn.dialect.name
+        if dialect == "sqlite":
+            conn.exec_driver_sql("PRAGMA busy_timeout = 60000")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+            return
+
+        if dialect == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            release = text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY}
+        elif dialect == "mssql":
+            conn.execute(text(
+                "EXEC sp_getapplock @Resource = :name, @LockMode = 'Exclusive', "
+                "@LockOwner = 'Session', @LockTimeout = -1"
+            ), {"name": SCHEMA_LOCK_NAME})
+            release = text("EXEC sp_releaseapplock @Resource = :name, @LockOwner = 'Session'"), {"name": SCHEMA_LOCK_NAME}
+        else:
+            release = None
+        try:
+            yield conn
+        finally:
+            if release is not None:
+                conn.execute(*release)
+
+
+def _merge_duplicate_cart_items(conn) -> None:
+    """Fold duplicate (user, product) cart lines into the oldest one."""
+    conn.execute(text(
+        "UPDATE cart_items SET quantity = ("
+        " SELECT SUM(COALESCE(other.quantity, 1)) FROM cart_items other"
+        " WHERE other.user_id = cart_items.user_id AND other.product_id = cart_items.product_id)"
+        " WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+    ))
+    conn.execute(text(
+        "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)"
+    ))
+
+
+def _drop_duplicate_wishlist_items(conn) -> None:
+    """Keep the oldest of duplicate (user, product) wishlist rows and recount."""
+    conn.execute(text(
+        "DELETE FROM wishlists WHERE id NOT IN (SELECT MIN(id) FROM wishlists GROUP BY user_id, product_id)"
+    ))
+    # Duplicates were counted too
+    conn.execute(text(
+        "UPDATE products SET wishlist_count = (SELECT COUNT(*) FROM wishlists WHERE wishlists.product_id = products.id)"
+    ))
+
+
+# Unique indexes added to existing tables, with the clean-up that must run
+# first so rows written before the index existed do not violate it
+_BEFORE_UNIQUE_INDEX = {
+    "uq_cart_items_user_product": _merge_duplicate_cart_items,
+    "uq_wishlists_user_product": _drop_duplicate_wishlist_items,
+}
+
+
+def _default_literal(column, dialect) -> Optional[str]:
+    """A column's scalar default rendered as a SQL literal for `dialect`, or None."""
+    if column.default is None or not column.default.is_scalar or column.default.arg is None:
+        return None
+    expression = literal(column.default.arg, column.type)
+    return str(expression.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _upgrade_existing_tables(conn) -> None:
+    """
+    Add columns and indexes that create_all skips on tables that already exist.
+
+    Only additive changes are handled: new columns must be nullable or have a
+    scalar default, and new unique indexes need an entry in
+    _BEFORE_UNIQUE_INDEX if existing rows may collide. Anything else needs a
+    real migration. Runs on the connection holding the schema lock.
+    """
+    from sqlalchemy import inspect
+
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD {column.name} {column.type.compile(dialect=conn.dialect)}"
+            default = _default_literal(column, conn.dialect)
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            elif not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} without a default")
+            conn.execute(text(ddl))
+        present_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in present_indexes:
+                continue
+            prepare = _BEFORE_UNIQUE_INDEX.get(index.name)
+            if prepare:
+                prepare(conn)
+            index.create(conn)
+
+
+def init_db(bind=None, mode: str = None) -> str:
+    """
+    Prepare the schema at startup instead of at import time.
+
+    A single version lookup is the fast path: when the database is already
+    stamped with SCHEMA_VERSION nothing else is inspected or created.
+    Otherwise setup runs under a database-level lock, so workers starting
+    together upgrade the schema once and the rest find it current.
+
+    Returns:
+        "current", "created" or "skipped"
+    """
+    from sqlalchemy import delete
+    import models
+
+    bind = bind or engine
+    mode = (mode or DB_SCHEMA_MODE).lower()
+    if mode == "skip":
+        return "skipped"
+
+    version = get_schema_version(bind)
+    if version == SCHEMA_VERSION:
+        return "current"
+
+    if mode == "check":
+        raise RuntimeError(
+            f"Database schema version {version} does not match expected "
+            f"{SCHEMA_VERSION}; run with DB_SCHEMA_MODE=create or migrate first"
+        )
+
+    with _schema_lock(bind) as conn:
+        # Another worker may have finished setup while we waited for the lock
+        if get_schema_version(conn) == SCHEMA_VERSION:
+            return "current"
+        Base.metadata.create_all(bind=conn)
+        _upgrade_existing_tables(conn)
+        conn.execute(delete(models.SchemaVersion))
+        conn.execute(models.SchemaVersion.__table__.insert().values(version=SCHEMA_VERSION))
+    return "created"
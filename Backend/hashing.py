@@ -0,0 +1,105 @@
+"""
+Bounded executor for password hashing.
+
+argon2 is deliberately slow and memory-hungry. Run on the request threads, a
+login burst ties up the same threadpool every database-bound route uses, so
+hashes and verifications go through their own small pool instead; async
+routes await them without holding a request thread at all. Admission is
+capped at workers + queue limit; past that, callers get PasswordHasherBusy
+immediately rather than waiting behind the burst.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from passlib.context import CryptContext
+
+from metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_REJECTED
+
+# argon2 cost parameters; existing hashes keep verifying after a change
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "8"))
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool is already at its admission limit."""
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords on a dedicated thread pool.
+
+    argon2-cffi releases the GIL while hashing, so threads run in parallel.
+    At most `workers` hashes run at once and `queue_limit` more may wait.
+    """
+
+    def __init__(self, context: CryptContext, workers: int = PASSWORD_HASH_WORKERS,
+                 queue_limit: int = PASSWORD_HASH_QUEUE):
+        self.context = context
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def _timed(self, operation: str, func: Callable[..., T], *args) -> T:
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_HASH_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        PASSWORD_HASH_QUEUE_DEPTH.dec()
+        self._slots.release()
+
+    def _submit(self, operation: str, func: Callable[..., T], *args) -> "Future[T]":
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.labels(operation).inc()
+            raise PasswordHasherBusy(operation)
+        PASSWORD_HASH_QUEUE_DEPTH.inc()
+        try:
+            future = self._pool.submit(self._timed, operation, func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the work is done, even if the caller stops waiting
+        future.add_done_callback(self._release)
+        return future
+
+    def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+        return self._submit(operation, func, *args).result()
+
+    async def _run_async(self, operation: str, func: Callable[..., T], *args) -> T:
+        return await asyncio.wrap_future(self._submit(operation, func, *args))
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", self.context.hash, password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run("verify", self.context.verify, password, hashed)
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run_async("hash", self.context.hash, password)
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await self._run_async("verify", self.context.verify, password, hashed)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def make_context() -> CryptContext:
+    """argon2 context with the configured cost parameters."""
+    return CryptContext(
+        schemes=["argon2"],
+        deprecated="auto",
+        argon2__time_cost=ARGON2_TIME_COST,
+        argon2__memory_cost=ARGON2_MEMORY_COST,
+        argon2__parallelism=ARGON2_PARALLELISM
+    )
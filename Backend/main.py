@@ -1,23 +1,45 @@
 """FastAPI main application."""
 import sys
 import os
+import time
+from contextlib import asynccontextmanager
+
+_import_started = time.perf_counter()
 
 # Add current directory to path so imports work
 sys.path.insert(0, os.path.dirname(__file__))
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
-from routers import products, cart, orders, users, auth, wishlist, reviews, uploads
-from metrics import PrometheusMiddleware, get_metrics
+from database import init_db
+from cart_store import close_cart_store
+from outbox import OutboxWorker, OUTBOX_WORKER
+from routers import products, cart, orders, users, auth, wishlist, reviews, uploads, analytics
+from metrics import PrometheusMiddleware, get_metrics, STARTUP_DURATION
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the database schema once per worker before serving requests."""
+    started = time.perf_counter()
+    init_db()
+    STARTUP_DURATION.labels(phase="schema").set(time.perf_counter() - started)
+    STARTUP_DURATION.labels(phase="total").set(time.perf_counter() - _import_started)
+    worker = OutboxWorker() if OUTBOX_WORKER == "inprocess" else None
+    if worker:
+        worker.start()
+    yield
+    if worker:
+        worker.stop()
+    # Persist carts still waiting in a write-behind store
+    close_cart_store()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Online Store API",
     description="A simple e-commerce REST API for DevOps demo",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add Prometheus metrics middleware
@@ -40,6 +62,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -51,6 +74,9 @@ app.include_router(users.router)
 app.include_router(wishlist.router)
 app.include_router(reviews.router)
 app.include_router(uploads.router)
+app.include_router(analytics.router)
+
+STARTUP_DURATION.labels(phase="import").set(time.perf_counter() - _import_started)
 
 
 @app.get("/")
@@ -41,6 +41,49 @@ PRODUCTS_VIEWED = Counter(
     ['product_id']
 )
 
+# Outbox metrics
+OUTBOX_PENDING = Gauge(
+    'outbox_pending_events',
+    'Number of outbox events waiting to be processed'
+)
+
+OUTBOX_LAG = Gauge(
+    'outbox_lag_seconds',
+    'Age of the oldest pending outbox event in seconds'
+)
+
+OUTBOX_PROCESSED = Counter(
+    'outbox_events_processed_total',
+    'Outbox events handled by the worker',
+    ['event_type', 'status']
+)
+
+# Password hashing metrics
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    'password_hash_queue_depth',
+    'Password hash/verify calls running or waiting in the hashing pool'
+)
+
+PASSWORD_HASH_LATENCY = Histogram(
+    'password_hash_duration_seconds',
+    'Time spent computing a password hash or verification',
+    ['operation'],
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'Password hash/verify calls turned away because the pool was full',
+    ['operation']
+)
+
+# Startup metrics
+STARTUP_DURATION = Gauge(
+    'app_startup_duration_seconds',
+    'Time spent starting the application in seconds',
+    ['phase']
+)
+
 
 class PrometheusMiddleware(BaseHTTPMiddleware):
     """Middleware to collect Prometheus metrics."""
@@ -1,5 +1,5 @@
 """SQLAlchemy models for the store."""
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -7,6 +7,8 @@ from database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    # "Most wished-for" listings read this index from the top
+    __table_args__ = (Index("ix_products_wishlist_count", "wishlist_count", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -16,12 +18,27 @@ class Product(Base):
     image = Column(String(500), nullable=True)
     rating_rate = Column(Float, default=0.0)
     rating_count = Column(Integer, default=0)
+    # Running sum of review ratings; None = imported rating, read as rate * count
+    rating_sum = Column(Float, nullable=True)
+    # Reviews per star rating, for the distribution bar
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+    stock = Column(Integer, nullable=True)  # None = inventory not tracked
+    wishlist_count = Column(Integer, nullable=False, default=0)  # Wishlists holding this product
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     order_items = relationship("OrderItem", back_populates="product")
     wishlisted_by = relationship("Wishlist", back_populates="product", cascade="all, delete-orphan")
     reviews = relationship("Review", back_populates="product", cascade="all, delete-orphan")
 
+    @property
+    def rating_histogram(self) -> dict:
+        """Star rating -> number of reviews."""
+        return {star: getattr(self, f"stars_{star}") or 0 for star in range(1, 6)}
+
 
 class User(Base):
     __tablename__ = "users"
@@ -41,6 +58,11 @@ class User(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Per-user history pages and the fulfilment queue, both ordered by created_at
+    __table_args__ = (
+        Index("ix_orders_user_created", "user_id", "created_at"),
+        Index("ix_orders_status_created", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -60,6 +82,7 @@ class OrderItem(Base):
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, default=1)
     price = Column(Float, nullable=False)  # Price at time of order
+    category = Column(String(100), nullable=True)  # Category at time of order; NULL on rows that predate it
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
@@ -67,6 +90,9 @@ class OrderItem(Base):
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # One row per (user, product) so cart adds can upsert atomically. An Index
+    # rather than a constraint so upgrades of existing databases create it too.
+    __table_args__ = (Index("uq_cart_items_user_product", "user_id", "product_id", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -79,6 +105,8 @@ class CartItem(Base):
 
 class Wishlist(Base):
     __tablename__ = "wishlists"
+    # Decides duplicate adds; the per-process wishlist cache is only for reads
+    __table_args__ = (Index("uq_wishlists_user_product", "user_id", "product_id", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -91,6 +119,11 @@ class Wishlist(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    # Review pages per product, newest first or by rating
+    __table_args__ = (
+        Index("ix_reviews_product_created", "product_id", "created_at"),
+        Index("ix_reviews_product_rating", "product_id", "rating", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -103,3 +136,87 @@ class Review(Base):
     user = relationship("User", back_populates="reviews")
     product = relationship("Product", back_populates="reviews")
 
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request
+    status = Column(String(20), nullable=False, default="in_progress")  # in_progress, completed
+    locked_until = Column(DateTime, nullable=True)  # Lease on an in_progress claim; NULL = lapsed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+    # The worker scans pending events in due order
+    __table_args__ = (Index("ix_outbox_events_pending", "status", "available_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    aggregate_type = Column(String(50), nullable=False)  # order, user
+    aggregate_id = Column(Integer, nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), nullable=False, default="pending")  # pending, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+
+
+class ArchivedOrder(Base):
+    """Completed or cancelled orders moved out of `orders` by the archive job."""
+    __tablename__ = "orders_archive"
+    __table_args__ = (Index("ix_orders_archive_user_created", "user_id", "created_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Same ID as in orders
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(String(50))
+    total = Column(Float, default=0.0)
+    created_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime, nullable=False)
+
+    items = relationship("ArchivedOrderItem", back_populates="order", cascade="all, delete-orphan")
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, default=1)
+    price = Column(Float, nullable=False)
+    category = Column(String(100), nullable=True)
+
+    order = relationship("ArchivedOrder", back_populates="items")
+    product = relationship("Product")
+
+
+class SalesRollup(Base):
+    __tablename__ = "sales_rollups"
+    # One row per (dimension, key, day); order writes upsert into it
+    __table_args__ = (UniqueConstraint("dimension", "key", "day", name="uq_sales_rollups_dimension_key_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    dimension = Column(String(20), nullable=False)  # total, category, product
+    key = Column(String(100), nullable=False)  # "all", category name or product ID
+    revenue = Column(Float, nullable=False, default=0.0)
+    units = Column(Integer, nullable=False, default=0)
+    orders = Column(Integer, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
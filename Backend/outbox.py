@@ -0,0 +1,232 @@
+"""
+Transactional outbox worker.
+
+Side effects of orders and registrations (metrics today; emails and
+webhooks later) are written to outbox_events in the same transaction as
+the change itself, then drained here in batches outside the request.
+Events for one aggregate are handled strictly in order: a failing event is
+retried with backoff and holds back later events for the same aggregate.
+
+The worker also deletes expired idempotency keys every
+IDEMPOTENCY_PURGE_INTERVAL seconds, so the table only holds live keys.
+
+Runs inside the API process (OUTBOX_WORKER=inprocess, the default) or on
+its own; --once drains and purges once, for running from cron:
+
+    cd Backend && python -m outbox [--once] [--metrics-port 9101]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, exists, func
+from sqlalchemy.orm import Session, aliased
+
+from database import SessionLocal
+from metrics import (
+    ORDERS_TOTAL, USERS_REGISTERED,
+    OUTBOX_PENDING, OUTBOX_LAG, OUTBOX_PROCESSED
+)
+import models
+
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "inprocess").lower()
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_MAX_BACKOFF = 300  # seconds
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+# event_type -> handlers taking the decoded payload
+HANDLERS: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+
+
+def handler(event_type: str):
+    """Register a function to run for every event of `event_type`."""
+    def register(func: Callable[[dict], None]):
+        HANDLERS[event_type].append(func)
+        return func
+    return register
+
+
+@handler("order.created")
+def count_order(payload: dict) -> None:
+    ORDERS_TOTAL.inc()
+
+
+@handler("user.registered")
+def count_registration(payload: dict) -> None:
+    USERS_REGISTERED.inc()
+
+
+def enqueue(db: Session, aggregate_type: str, aggregate_id: int, event_type: str, payload: dict) -> models.OutboxEvent:
+    """Add an event to the caller's transaction; it is only visible once they commit."""
+    now = datetime.utcnow()
+    event = models.OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=json.dumps(payload),
+        created_at=now,
+        available_at=now
+    )
+    db.add(event)
+    return event
+
+
+def _next_batch(db: Session, batch_size: int) -> List[models.OutboxEvent]:
+    """Pending, due events that have no earlier pending event for their aggregate."""
+    now = datetime.utcnow()
+    earlier = aliased(models.OutboxEvent)
+    blocked = exists().where(and_(
+        earlier.aggregate_type == models.OutboxEvent.aggregate_type,
+        earlier.aggregate_id == models.OutboxEvent.aggregate_id,
+        earlier.status == "pending",
+        earlier.id < models.OutboxEvent.id
+    ))
+    return db.query(models.OutboxEvent).filter(
+        models.OutboxEvent.status == "pending",
+        models.OutboxEvent.available_at <= now,
+        ~blocked
+    ).order_by(models.OutboxEvent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+
+def _dispatch(event: models.OutboxEvent) -> None:
+    payload = json.loads(event.payload)
+    for func in HANDLERS.get(event.event_type, []):
+        func(payload)
+
+
+def process_batch(db: Session, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Handle one batch of events. Returns how many events were attempted."""
+    events = _next_batch(db, batch_size)
+    now = datetime.utcnow()
+    for event in events:
+        try:
+            _dispatch(event)
+        except Exception as e:
+            event.attempts += 1
+            event.last_error = str(e)[:1000]
+            if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                event.status = "dead"
+                event.processed_at = now
+            else:
+                backoff = min(2 ** event.attempts, OUTBOX_MAX_BACKOFF)
+                event.available_at = now + timedelta(seconds=backoff)
+            OUTBOX_PROCESSED.labels(event_type=event.event_type, status="error").inc()
+            logger.exception("Error handling outbox event %s (%s)", event.id, event.event_type)
+        else:
+            event.status = "done"
+            event.processed_at = now
+            OUTBOX_PROCESSED.labels(event_type=event.event_type, status="done").inc()
+    db.commit()
+    update_queue_metrics(db)
+    return len(events)
+
+
+def update_queue_metrics(db: Session) -> None:
+    """Export queue depth and the age of the oldest pending event."""
+    depth, oldest = db.query(
+        func.count(models.OutboxEvent.id),
+        func.min(models.OutboxEvent.created_at)
+    ).filter(models.OutboxEvent.status == "pending").one()
+    OUTBOX_PENDING.set(depth)
+    OUTBOX_LAG.set((datetime.utcnow() - oldest).total_seconds() if oldest else 0)
+
+
+def drain(session_factory=SessionLocal, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """Process batches until nothing is due. Returns the number of events attempted."""
+    total = 0
+    while True:
+        db = session_factory()
+        try:
+            handled = process_batch(db, batch_size)
+        finally:
+            db.close()
+        total += handled
+        if handled < batch_size:
+            return total
+
+
+def purge_idempotency_keys(session_factory=SessionLocal) -> int:
+    """Delete idempotency keys past their TTL. Returns how many were removed."""
+    import crud  # crud imports this module to enqueue events
+
+    db = session_factory()
+    try:
+        return crud.purge_expired_idempotency_keys(db)
+    finally:
+        db.close()
+
+
+class OutboxWorker:
+    """Background thread that drains the outbox on an interval and purges expired idempotency keys."""
+
+    def __init__(self, session_factory=SessionLocal, interval: float = OUTBOX_POLL_INTERVAL,
+                 purge_interval: float = IDEMPOTENCY_PURGE_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.purge_interval = purge_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        next_purge = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                drain(self.session_factory)
+            except Exception:
+                logger.exception("Error draining outbox")
+            if time.monotonic() >= next_purge:
+                try:
+                    purge_idempotency_keys(self.session_factory)
+                except Exception:
+                    logger.exception("Error purging idempotency keys")
+                next_purge = time.monotonic() + self.purge_interval
+            self._stop.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Drain the transactional outbox.")
+    parser.add_argument("--once", action="store_true", help="drain what is due, purge expired idempotency keys and exit")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    args = parser.parse_args(argv)
+
+    if args.once:
+        print(f"Processed {drain()} outbox events")
+        print(f"Purged {purge_idempotency_keys()} expired idempotency keys")
+        return
+
+    if args.metrics_port:
+        from prometheus_client import start_http_server
+        start_http_server(args.metrics_port)
+
+    worker = OutboxWorker()
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Product rating aggregates.
+
+Each product keeps a running rating_sum and rating_count, plus one review
+counter per star (stars_1 .. stars_5); rating_rate is derived from the sum
+and count. Review writes adjust them with one atomic UPDATE in the review's
+own transaction, so a write costs the same however many reviews the product
+has. The aggregates only ever count reviews stored here: a NULL rating_sum
+marks a product not tracked yet (an imported rating, or a row from before
+the column existed), and its first review write recomputes everything from
+its reviews, replacing the seeded rating.
+
+Reconciliation recomputes everything from the reviews table with grouped
+SQL per product-ID range, spreading the ranges over a process pool and
+writing each range back in one bulk UPDATE. It corrects drift, backfills the
+star counters and, with --include-imported, resets seeded ratings on products
+nobody has reviewed here:
+
+    cd Backend && python -m ratings [--workers 8] [--range-size 1000] [--dry-run]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import Numeric, and_, bindparam, case, cast, create_engine, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import SessionLocal
+import models
+
+RECONCILE_RANGE_SIZE = 1000
+STARS = range(1, 6)
+
+
+def _derived_rate(total, count):
+    return case((count > 0, func.round(cast(total * 1.0 / count, Numeric), 1)), else_=0.0)
+
+
+def _aggregate_values(total, count, stars) -> dict:
+    values = {"rating_sum": total, "rating_count": count, "rating_rate": _derived_rate(total, count)}
+    values.update({f"stars_{star}": n for star, n in zip(STARS, stars)})
+    return values
+
+
+def apply_review_change(db: Session, product_id: int, old: Optional[int], new: Optional[int]) -> None:
+    """
+    Adjust a product's rating aggregates in the caller's transaction for a
+    review whose rating went from `old` to `new` (None = no review).
+
+    Call it after making the change in the session; it is flushed first. A
+    tracked product gets one incremental UPDATE. An untracked one (NULL
+    rating_sum) is recomputed from its reviews instead, once.
+    """
+    if old == new:
+        return
+    db.flush()
+    product, review = models.Product, models.Review
+
+    # SET expressions all read the pre-update row
+    total = product.rating_sum + (new or 0) - (old or 0)
+    count = func.coalesce(product.rating_count, 0) + (new is not None) - (old is not None)
+    stars = [
+        func.coalesce(getattr(product, f"stars_{star}"), 0) + (new == star) - (old == star)
+        for star in STARS
+    ]
+    incremental = update(product).where(product.id == product_id, product.rating_sum.isnot(None)).values(
+        **_aggregate_values(total, count, stars)
+    )
+
+    def from_reviews(column, *criteria):
+        return select(column).where(review.product_id == product_id, *criteria).scalar_subquery()
+
+    total = from_reviews(func.coalesce(func.sum(review.rating), 0))
+    count = from_reviews(func.count(review.id))
+    stars = [from_reviews(func.count(review.id), review.rating == star) for star in STARS]
+    recompute = update(product).where(product.id == product_id, product.rating_sum.is_(None)).values(
+        **_aggregate_values(total, count, stars)
+    )
+
+    # A concurrent first write may start tracking the product between the two
+    # statements; the second round then applies the delta on top of it
+    for _ in range(2):
+        for stmt in (incremental, recompute):
+            if db.execute(stmt.execution_options(synchronize_session=False)).rowcount:
+                return
+
+
+def _reconcile_range(
+    db: Session,
+    low: int,
+    high: int,
+    dry_run: bool = False,
+    include_imported: bool = False
+) -> Tuple[int, int]:
+    """
+    Recompute aggregates for products with low <= id < high in one transaction.
+
+    Returns (products checked, products corrected).
+    """
+    in_range = and_(models.Product.id >= low, models.Product.id < high)
+    star_columns = [getattr(models.Product, f"stars_{star}") for star in STARS]
+    # Lock the products first: review writes that commit after this wait on the
+    # lock and then apply their delta on top of the recomputed values
+    current = {
+        row[0]: tuple(row[1:])
+        for row in db.execute(
+            select(
+                models.Product.id, models.Product.rating_sum, models.Product.rating_count,
+                models.Product.rating_rate, *star_columns
+            )
+            .where(in_range)
+            .with_for_update()
+        )
+    }
+    # The rate is rounded by the same SQL expression as live review writes
+    total, count = func.sum(models.Review.rating), func.count(models.Review.id)
+    actual = {
+        row[0]: (row[1], row[2], float(row[3])) + tuple(row[4:])
+        for row in db.execute(
+            select(
+                models.Review.product_id,
+                total,
+                count,
+                _derived_rate(total, count),
+                *[func.sum(case((models.Review.rating == star, 1), else_=0)) for star in STARS]
+            )
+            .where(models.Review.product_id >= low, models.Review.product_id < high)
+            .group_by(models.Review.product_id)
+        )
+    }
+
+    rows = []
+    for product_id, stored in current.items():
+        if product_id not in actual and stored[0] is None and not include_imported:
+            continue  # Imported rating, never reviewed here
+        computed = actual.get(product_id, (0, 0, 0.0) + (0,) * len(STARS))
+        if stored == computed:
+            continue
+        total, count, rate, *stars = computed
+        row = {"product_id": product_id, "rating_sum": total, "rating_count": count, "rating_rate": rate}
+        row.update({f"stars_{star}": n for star, n in zip(STARS, stars)})
+        rows.append(row)
+
+    if rows and not dry_run:
+        table = models.Product.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("product_id"))
+            .values({name: bindparam(name) for name in rows[0] if name != "product_id"}),
+            rows
+        )
+        db.commit()
+    else:
+        db.rollback()
+    return len(current), len(rows)
+
+
+def _id_ranges(db: Session, range_size: int) -> List[Tuple[int, int]]:
+    low, high = db.execute(select(func.min(models.Product.id), func.max(models.Product.id))).one()
+    if low is None:
+        return []
+    return [(start, min(start + range_size, high + 1)) for start in range(low, high + 1, range_size)]
+
+
+# Each pool process opens its own engine; connections cannot cross a fork
+_worker_session = None
+
+
+def _init_worker(database_url: str) -> None:
+    global _worker_session
+    _worker_session = sessionmaker(bind=create_engine(database_url))
+
+
+def _reconcile_range_in_worker(low: int, high: int, dry_run: bool, include_imported: bool) -> Tuple[int, int]:
+    db = _worker_session()
+    try:
+        return _reconcile_range(db, low, high, dry_run, include_imported)
+    finally:
+        db.close()
+
+
+def reconcile(
+    db: Session,
+    range_size: int = RECONCILE_RANGE_SIZE,
+    workers: int = 1,
+    dry_run: bool = False,
+    include_imported: bool = False,
+    progress: Optional[Callable[[int, int, int, int], None]] = None
+) -> int:
+    """
+    Recompute aggregates from the reviews, one product-ID range per transaction.
+
+    Returns the number of products corrected (or that would be, with
+    dry_run). With workers > 1 the ranges are spread over a process pool
+    connected to the same database as `db`. `progress(done, total, checked,
+    corrected)` is called as each range finishes. Imported ratings on
+    never-reviewed products are kept unless `include_imported` is set.
+    """
+    ranges = _id_ranges(db, range_size)
+    db.rollback()
+    checked = corrected = 0
+
+    def finished(done: int, result: Tuple[int, int]) -> None:
+        nonlocal checked, corrected
+        checked += result[0]
+        corrected += result[1]
+        if progress:
+            progress(done, len(ranges), checked, corrected)
+
+    if workers <= 1:
+        for done, (low, high) in enumerate(ranges, 1):
+            finished(done, _reconcile_range(db, low, high, dry_run, include_imported))
+        return corrected
+
+    database_url = db.get_bind().url.render_as_string(hide_password=False)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(database_url,)) as pool:
+        futures = [
+            pool.submit(_reconcile_range_in_worker, low, high, dry_run, include_imported)
+            for low, high in ranges
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            finished(done, future.result())
+    return corrected
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recompute product rating aggregates and star counts from the reviews.")
+    parser.add_argument("--range-size", type=int, default=RECONCILE_RANGE_SIZE, help="product IDs per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes reconciling ranges in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--include-imported", action="store_true",
+                        help="also reset seeded ratings on products without reviews")
+    args = parser.parse_args(argv)
+
+    def report(done, total, checked, corrected):
+        print(f"[{done}/{total}] checked {checked} products, {corrected} drifted", file=sys.stderr)
+
+    db = SessionLocal()
+    try:
+        corrected = reconcile(db, args.range_size, args.workers, args.dry_run, args.include_imported, report)
+        verb = "Would correct" if args.dry_run else "Corrected"
+        print(f"{verb} rating aggregates on {corrected} products")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
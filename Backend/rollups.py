@@ -0,0 +1,186 @@
+"""
+Daily sales rollups.
+
+Revenue, units and order counts per day are kept in sales_rollups for three
+dimensions: the store total, each category and each product. crud updates
+them in the same transaction as the order (on creation and when an order is
+cancelled or un-cancelled), so reports never have to GROUP BY the order tables.
+Cancelled orders are not counted. Orders are attributed to their product's
+category at the time they are counted.
+
+Rebuild after a backfill or to repair drift:
+
+    cd Backend && python -m rollups [--start 2024-01-01] [--end 2024-01-31]
+"""
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, selectinload
+
+from database import SessionLocal
+import models
+
+DIMENSIONS = ("total", "category", "product")
+TOTAL_KEY = "all"
+
+# (product_id, category, quantity, unit price)
+Line = Tuple[int, str, int, float]
+# (dimension, key) -> [revenue, units, orders]
+Deltas = Dict[Tuple[str, str], List[float]]
+
+
+def _line_category(item) -> str:
+    # The category stored at order time; older rows fall back to the product's current one
+    if item.category is not None:
+        return item.category
+    return item.product.category if item.product else "unknown"
+
+
+def order_lines(order) -> List[Line]:
+    """Rollup lines for an order (hot or archived) whose items and products are loaded."""
+    return [(item.product_id, _line_category(item), item.quantity, item.price) for item in order.items]
+
+
+def _add_order(deltas: Deltas, lines: Iterable[Line], sign: int = 1) -> None:
+    """Accumulate one order into `deltas`; each dimension key counts the order once."""
+    touched = set()
+    for product_id, category, quantity, price in lines:
+        for key in (("total", TOTAL_KEY), ("category", category), ("product", str(product_id))):
+            entry = deltas.setdefault(key, [0.0, 0, 0])
+            entry[0] += sign * price * quantity
+            entry[1] += sign * quantity
+            if key not in touched:
+                entry[2] += sign
+                touched.add(key)
+
+
+def _on_conflict(dialect: str, rows: List[dict]):
+    """Multi-row INSERT that adds to existing rollup rows (SQLite/Postgres)."""
+    insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+    stmt = insert(models.SalesRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.SalesRollup.dimension, models.SalesRollup.key, models.SalesRollup.day],
+        set_={
+            "revenue": models.SalesRollup.revenue + stmt.excluded.revenue,
+            "units": models.SalesRollup.units + stmt.excluded.units,
+            "orders": models.SalesRollup.orders + stmt.excluded.orders
+        }
+    )
+
+
+def _apply(db: Session, day: date, deltas: Deltas) -> None:
+    # Sorted so concurrent checkouts lock rollup rows in the same order
+    rows = [
+        {"day": day, "dimension": dimension, "key": key, "revenue": revenue, "units": units, "orders": orders}
+        for (dimension, key), (revenue, units, orders) in sorted(deltas.items())
+    ]
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        db.execute(_on_conflict(dialect, rows))
+        return
+    for row in rows:
+        existing = db.query(models.SalesRollup).filter(
+            models.SalesRollup.dimension == row["dimension"],
+            models.SalesRollup.key == row["key"],
+            models.SalesRollup.day == row["day"]
+        ).with_for_update().first()
+        if existing:
+            existing.revenue += row["revenue"]
+            existing.units += row["units"]
+            existing.orders += row["orders"]
+        else:
+            db.add(models.SalesRollup(**row))
+    db.flush()
+
+
+def record_order(db: Session, day: date, lines: Iterable[Line], sign: int = 1) -> None:
+    """Add (sign=1) or remove (sign=-1) an order's lines; the caller commits."""
+    deltas: Deltas = {}
+    _add_order(deltas, lines, sign)
+    _apply(db, day, deltas)
+
+
+def record_orders(db: Session, orders: Iterable, sign: int = 1) -> None:
+    """record_order for many loaded orders, one upsert per day touched."""
+    by_day: Dict[date, Deltas] = defaultdict(dict)
+    for order in orders:
+        _add_order(by_day[order.created_at.date()], order_lines(order), sign)
+    for day, deltas in sorted(by_day.items()):
+        _apply(db, day, deltas)
+
+
+def get_sales(
+    db: Session,
+    start: date,
+    end: date,
+    dimension: str = "total",
+    key: Optional[str] = None,
+    limit: int = 1000
+) -> List[models.SalesRollup]:
+    query = db.query(models.SalesRollup).filter(
+        models.SalesRollup.dimension == dimension,
+        models.SalesRollup.day >= start,
+        models.SalesRollup.day <= end
+    )
+    if key is not None:
+        query = query.filter(models.SalesRollup.key == key)
+    return query.order_by(models.SalesRollup.day, models.SalesRollup.key).limit(limit).all()
+
+
+def rebuild(db: Session, start: Optional[date] = None, end: Optional[date] = None, batch_size: int = 500) -> int:
+    """
+    Recompute rollups for [start, end] (everything by default) from the orders.
+
+    Runs in one transaction so readers never see a half-built range. Orders
+    placed while it runs may be missed; run it when the store is quiet or
+    rebuild the affected days again. Returns the number of orders counted.
+    """
+    cleanup = delete(models.SalesRollup)
+    if start is not None:
+        cleanup = cleanup.where(models.SalesRollup.day >= start)
+    if end is not None:
+        cleanup = cleanup.where(models.SalesRollup.day <= end)
+
+    by_day: Dict[date, Deltas] = defaultdict(dict)
+    counted = 0
+    # Archived orders still count towards their day
+    for order_model, item_model in ((models.Order, models.OrderItem), (models.ArchivedOrder, models.ArchivedOrderItem)):
+        query = db.query(order_model).options(
+            selectinload(order_model.items).selectinload(item_model.product)
+        ).filter(or_(order_model.status.is_(None), order_model.status != "cancelled"))
+        if start is not None:
+            query = query.filter(order_model.created_at >= datetime.combine(start, datetime.min.time()))
+        if end is not None:
+            query = query.filter(order_model.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        for order in query.order_by(order_model.id).yield_per(batch_size):
+            _add_order(by_day[order.created_at.date()], order_lines(order))
+            counted += 1
+
+    db.execute(cleanup)
+    for day, deltas in sorted(by_day.items()):
+        _apply(db, day, deltas)
+    db.commit()
+    return counted
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Rebuild daily sales rollups from the orders.")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        print(f"Rebuilt sales rollups from {rebuild(db, args.start, args.end)} orders")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
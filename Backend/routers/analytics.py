@@ -0,0 +1,30 @@
+"""Read-only sales reporting over the daily rollups."""
+from datetime import date, datetime, timedelta
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from auth import Principal, get_current_admin
+import rollups, schemas
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/sales", response_model=List[schemas.SalesRollupResponse])
+def get_sales(
+    start: Optional[date] = Query(None, description="First day (default: 30 days before end)"),
+    end: Optional[date] = Query(None, description="Last day (default: today, UTC)"),
+    dimension: Literal["total", "category", "product"] = "total",
+    key: Optional[str] = Query(None, description="Only this category or product ID"),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Daily revenue, units and orders, excluding cancelled orders (admins only)."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return rollups.get_sales(db, start, end, dimension, key, limit)
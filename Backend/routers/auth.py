@@ -1,28 +1,29 @@
-"""Authentication routes - register and login."""
+"""
+Authentication routes - register and login.
+
+These routes are async so the password hash is awaited on the hashing pool
+without holding a request thread; their database work still runs in the
+threadpool, one short hop at a time.
+"""
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from database import get_db
-import models, schemas
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+import models, schemas, outbox
+from auth import Principal, get_password_hash_async, verify_password_async, create_access_token, get_current_user
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
-@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register(user_data: schemas.UserRegister, db: Session = Depends(get_db)):
-    """Register a new user with email and password."""
-    # Check if email already exists
-    existing_user = db.query(models.User).filter(models.User.email == user_data.email).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+def _user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+def _create_user(db: Session, user_data: schemas.UserRegister, hashed_password: str) -> models.User:
     db_user = models.User(
         name=user_data.name,
         email=user_data.email,
@@ -30,17 +31,34 @@ def register(user_data: schemas.UserRegister, db: Session = Depends(get_db)):
         is_active=True
     )
     db.add(db_user)
+    db.flush()  # Get user ID for the outbox event
+    outbox.enqueue(db, "user", db_user.id, "user.registered", {"user_id": db_user.id, "email": db_user.email})
     db.commit()
     db.refresh(db_user)
-    
     return db_user
 
 
+@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
+async def register(user_data: schemas.UserRegister, db: Session = Depends(get_db)):
+    """Register a new user with email and password."""
+    # Check if email already exists
+    existing_user = await run_in_threadpool(_user_by_email, db, user_data.email)
+    if existing_user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    
+    # Create new user
+    hashed_password = await get_password_hash_async(user_data.password)
+    return await run_in_threadpool(_create_user, db, user_data, hashed_password)
+
+
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login with email and password, returns JWT token."""
     # Find user by email (username field is used for email)
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+    user = await run_in_threadpool(_user_by_email, db, form_data.username)
     
     if not user or not user.password_hash:
         raise HTTPException(
@@ -49,7 +67,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(form_data.password, user.password_hash):
+    if not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -69,9 +87,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 @router.post("/login/json", response_model=schemas.Token)
-def login_json(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login_json(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
     """Login with JSON body (alternative to form data)."""
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
+    user = await run_in_threadpool(_user_by_email, db, login_data.email)
     
     if not user or not user.password_hash:
         raise HTTPException(
@@ -80,7 +98,7 @@ def login_json(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(login_data.password, user.password_hash):
+    if not await verify_password_async(login_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -100,7 +118,9 @@ def login_json(login_data: schemas.UserLogin, db: Session = Depends(get_db)):
 
 @router.get("/me", response_model=schemas.User)
 def get_current_user_info(
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Get current authenticated user info."""
-    return current_user
+    # The cached principal only carries id/name/is_active
+    return db.get(models.User, current_user.id)
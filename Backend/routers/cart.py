@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
+from cart_store import CartStore, get_cart_store
 import crud, schemas
 
 router = APIRouter(prefix="/cart", tags=["cart"])
@@ -16,19 +17,31 @@ def get_current_user_id(x_user_id: int = Header(..., description="User ID header
 @router.get("/", response_model=schemas.CartResponse)
 def get_cart(
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
 ):
     """Get the current user's cart."""
-    items = crud.get_cart_items(db, user_id)
-    total = sum(item.product.price * item.quantity for item in items if item.product)
+    items = store.get_items(db, user_id)
+    total = store.get_total(db, user_id)
     return schemas.CartResponse(items=items, total=total)
 
 
+@router.get("/summary", response_model=schemas.CartSummary)
+def get_cart_summary(
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
+):
+    """Item count, quantity and total for header badges, served from a per-user cache."""
+    return store.get_summary(db, user_id)
+
+
 @router.post("/items", response_model=schemas.CartItemResponse, status_code=201)
 def add_item_to_cart(
     item: schemas.CartItemCreate,
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
 ):
     """Add an item to the cart."""
     # Verify product exists
@@ -36,7 +49,33 @@ def add_item_to_cart(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return crud.add_to_cart(db, user_id, item)
+    return store.add(db, user_id, item.product_id, item.quantity)
+
+
+@router.put("/", response_model=schemas.CartResponse)
+def bulk_update_cart(
+    changes: schemas.CartBulkUpdate,
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
+):
+    """Set, increment and remove many cart lines in one transaction."""
+    upsert_ids = [line.product_id for line in changes.set + changes.increment]
+    all_ids = upsert_ids + changes.remove
+    if len(all_ids) != len(set(all_ids)):
+        raise HTTPException(status_code=400, detail="Each product may appear in only one cart operation")
+    if any(line.quantity <= 0 for line in changes.increment):
+        raise HTTPException(status_code=400, detail="Increment quantities must be positive")
+
+    products = crud.get_products_by_ids(db, upsert_ids)
+    missing = [product_id for product_id in upsert_ids if product_id not in products]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {missing}")
+
+    store.bulk_update(db, user_id, changes)
+    items = store.get_items(db, user_id)
+    total = store.get_total(db, user_id)
+    return schemas.CartResponse(items=items, total=total)
 
 
 @router.put("/items/{product_id}")
@@ -44,10 +83,11 @@ def update_cart_item(
     product_id: int,
     quantity: int,
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
 ):
     """Update quantity of an item in cart."""
-    result = crud.update_cart_item(db, user_id, product_id, quantity)
+    result = store.set_quantity(db, user_id, product_id, quantity)
     if result is None and quantity > 0:
         raise HTTPException(status_code=404, detail="Item not in cart")
     return {"message": "Cart updated"}
@@ -57,17 +97,19 @@ def update_cart_item(
 def remove_cart_item(
     product_id: int,
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
 ):
     """Remove an item from cart."""
-    if not crud.remove_from_cart(db, user_id, product_id):
+    if not store.remove(db, user_id, product_id):
         raise HTTPException(status_code=404, detail="Item not in cart")
 
 
 @router.delete("/", status_code=204)
 def clear_cart(
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store)
 ):
     """Clear all items from cart."""
-    crud.clear_cart(db, user_id)
+    store.clear(db, user_id)
@@ -1,28 +1,142 @@
 """Order API endpoints."""
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import json
+import os
+import time
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, List, Optional
 from database import get_db
-from models import User
-from auth import get_current_user
-import crud, schemas
+from auth import Principal, get_current_admin, get_current_user
+from cart_store import CartStore, get_cart_store
+import crud, models, schemas
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+# How long a retry waits for the original request holding the same key
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+
+def _fingerprint(route: str, payload) -> str:
+    return hashlib.sha256(f"{route}:{json.dumps(payload, sort_keys=True)}".encode()).hexdigest()
+
+
+def _stored_response(db: Session, record) -> Optional[JSONResponse]:
+    """
+    Wait for the request owning the key to finish, then replay its response.
+
+    Returns None if the owner's lease lapses first, so the key can be taken over.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while record is not None and record.status != "completed":
+        if crud.idempotency_lease_expired(record):
+            return None
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        time.sleep(IDEMPOTENCY_POLL_SECONDS)
+        record = crud.get_idempotency_key(db, record.user_id, record.key)
+    if record is None:
+        raise HTTPException(status_code=409, detail="The original request with this Idempotency-Key failed; retry")
+    return JSONResponse(status_code=record.response_status, content=json.loads(record.response_body))
+
+
+def _idempotent(
+    db: Session,
+    user_id: int,
+    key: Optional[str],
+    fingerprint: str,
+    place: Callable[[], models.Order]
+):
+    """
+    Run `place` at most once per (user, Idempotency-Key).
+
+    Replays are answered from the stored response alone, without reading
+    the cart, product or order tables. Failed attempts release the key, and
+    a claim whose lease lapsed is taken over by the next retry.
+    """
+    if not key:
+        return place()
+
+    for _ in range(3):
+        record = crud.claim_idempotency_key(db, user_id, key, fingerprint)
+        if record is None:
+            break
+        if record.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        response = _stored_response(db, record)
+        if response is not None:
+            return response
+    else:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    try:
+        order = place()
+    except Exception:
+        db.rollback()
+        crud.release_idempotency_key(db, user_id, key)
+        raise
+
+    body = schemas.OrderResponse.model_validate(order).model_dump(mode="json")
+    crud.complete_idempotency_key(db, user_id, key, 201, body)
+    return JSONResponse(status_code=201, content=body)
+
+
+def _stock_conflict(error: crud.InsufficientStockError) -> HTTPException:
+    """A 409 listing the lines that could not be reserved."""
+    return HTTPException(
+        status_code=409,
+        detail={
+            "message": "Insufficient stock",
+            "items": [failure.model_dump() for failure in error.failures]
+        }
+    )
+
+
+def _place_order(db: Session, user_id: int, items, products) -> models.Order:
+    """Create the order, turning stock shortfalls into a 409 with per-item details."""
+    try:
+        return crud.create_order(db, user_id, items, products=products)
+    except crud.InsufficientStockError as e:
+        raise _stock_conflict(e)
+
 
 @router.get("/", response_model=List[schemas.OrderResponse])
 def list_orders(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[int] = Query(default=None, description="X-Next-Cursor from the previous page"),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all orders for the current user."""
-    return crud.get_orders(db, current_user.id)
+    """Get the current user's orders, newest first, one page at a time."""
+    orders = crud.get_orders(db, current_user.id, limit=limit, cursor=cursor)
+    if len(orders) == limit:
+        response.headers["X-Next-Cursor"] = str(orders[-1].id)
+    return orders
+
+
+@router.get("/queue", response_model=List[schemas.OrderResponse])
+def order_queue(
+    response: Response,
+    status: schemas.OrderStatus = "pending",
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[int] = Query(default=None, description="X-Next-Cursor from the previous page"),
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """List all orders in a status, oldest first (fulfilment endpoint, admins only)."""
+    orders = crud.get_order_queue(db, status, limit=limit, cursor=cursor)
+    if len(orders) == limit:
+        response.headers["X-Next-Cursor"] = str(orders[-1].id)
+    return orders
 
 
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
 def get_order(
     order_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific order."""
@@ -37,55 +151,90 @@ def get_order(
 @router.post("/", response_model=schemas.OrderResponse, status_code=201)
 def create_order(
     order: schemas.OrderCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """Create a new order from provided items."""
     if not order.items:
         raise HTTPException(status_code=400, detail="Order must have at least one item")
-    
-    # Verify all products exist
-    for item in order.items:
-        if not crud.get_product(db, item.product_id):
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-    
-    return crud.create_order(db, current_user.id, order.items)
+
+    def place():
+        # Verify all products exist with a single query
+        products = crud.get_products_by_ids(db, [item.product_id for item in order.items])
+        for item in order.items:
+            if item.product_id not in products:
+                raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
+        return _place_order(db, current_user.id, order.items, products)
+
+    fingerprint = _fingerprint("orders", order.model_dump())
+    return _idempotent(db, current_user.id, idempotency_key, fingerprint, place)
 
 
 @router.post("/from-cart", response_model=schemas.OrderResponse, status_code=201)
 def create_order_from_cart(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    store: CartStore = Depends(get_cart_store),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """Create an order from the user's current cart."""
-    cart_items = crud.get_cart_items(db, current_user.id)
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty")
-    
-    # Convert cart items to order items
-    order_items = [
-        schemas.OrderItemBase(product_id=item.product_id, quantity=item.quantity)
-        for item in cart_items
-    ]
-    
-    # Create order and clear cart
-    order = crud.create_order(db, current_user.id, order_items)
-    crud.clear_cart(db, current_user.id)
-    
-    return order
+    def place():
+        cart_items = store.get_items(db, current_user.id)
+        if not cart_items:
+            raise HTTPException(status_code=400, detail="Cart is empty")
+        if any(item.quantity < 1 for item in cart_items):
+            raise HTTPException(status_code=400, detail="Cart item quantities must be at least 1")
+
+        # Convert cart items to order items
+        order_items = [
+            schemas.OrderItemBase(product_id=item.product_id, quantity=item.quantity)
+            for item in cart_items
+        ]
+
+        # Create order from the products already loaded with the cart, then clear it
+        products = {item.product_id: item.product for item in cart_items if item.product}
+        order = _place_order(db, current_user.id, order_items, products)
+        store.clear(db, current_user.id)
+        return order
+
+    return _idempotent(db, current_user.id, idempotency_key, _fingerprint("orders/from-cart", None), place)
+
+
+@router.patch("/status", response_model=schemas.OrderStatusBulkResult)
+def bulk_update_order_status(
+    update: schemas.OrderStatusBulkUpdate,
+    current_user: Principal = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Move many orders from expected_status to status at once (fulfilment endpoint, admins only)."""
+    if update.expected_status == update.status:
+        raise HTTPException(status_code=400, detail="status must differ from expected_status")
+
+    try:
+        updated = crud.bulk_update_order_status(db, update.order_ids, update.expected_status, update.status)
+    except crud.InsufficientStockError as e:
+        raise _stock_conflict(e)
+    changed = set(updated)
+    skipped = sorted({order_id for order_id in update.order_ids if order_id not in changed})
+    return schemas.OrderStatusBulkResult(updated=updated, skipped=skipped)
 
 
 @router.patch("/{order_id}/status")
 def update_order_status(
     order_id: int,
     status: str,
+    current_user: Principal = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Update order status (admin endpoint)."""
     if status not in ["pending", "completed", "cancelled"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    order = crud.update_order_status(db, order_id, status)
+    try:
+        order = crud.update_order_status(db, order_id, status)
+    except crud.InsufficientStockError as e:
+        raise _stock_conflict(e)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -1,8 +1,9 @@
 """Product API endpoints."""
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from database import get_db
+from auth import Principal, get_current_user_optional
 import crud, schemas
 
 router = APIRouter(prefix="/products", tags=["products"])
@@ -19,12 +20,26 @@ def list_products(
     skip: int = 0,
     limit: int = Query(default=100, le=100),
     category: Optional[str] = None,
+    sort: Optional[Literal["wishlisted"]] = Query(default=None, description="wishlisted: most wished-for first"),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
     db: Session = Depends(get_db)
 ):
-    """Get all products, optionally filtered by category."""
+    """Get all products, optionally filtered by category.
+
+    Authenticated callers also get `in_wishlist` on every product.
+    """
     if category:
-        return crud.get_products_by_category(db, category)
-    return crud.get_products(db, skip=skip, limit=limit)
+        products = crud.get_products_by_category(db, category, sort=sort)
+    else:
+        products = crud.get_products(db, skip=skip, limit=limit, sort=sort)
+    if current_user is None:
+        return products
+
+    wishlisted = crud.get_wishlisted_ids(db, current_user.id, [p.id for p in products])
+    return [
+        schemas.ProductResponse.model_validate(p).model_copy(update={"in_wishlist": p.id in wishlisted})
+        for p in products
+    ]
 
 
 @router.get("/{product_id}", response_model=schemas.ProductResponse)
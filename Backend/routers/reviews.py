@@ -1,16 +1,16 @@
 """Reviews router for product reviews."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from typing import List, Literal, Optional
 
 from database import get_db
-from models import Review, Product, User
+from models import Review, Product
 from schemas import (
     ReviewCreate, ReviewUpdate, ReviewResponse, 
     ProductReviewsResponse
 )
-from auth import get_current_user
+from auth import Principal, get_current_user
+import crud, ratings
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
@@ -18,9 +18,13 @@ router = APIRouter(prefix="/reviews", tags=["reviews"])
 @router.get("/product/{product_id}", response_model=ProductReviewsResponse)
 def get_product_reviews(
     product_id: int,
+    response: Response,
+    sort: Literal["newest", "highest", "lowest"] = "newest",
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[int] = Query(default=None, description="X-Next-Cursor from the previous page"),
     db: Session = Depends(get_db)
 ):
-    """Get all reviews for a product."""
+    """Get a page of reviews for a product with its rating summary."""
     # Check if product exists
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
@@ -29,17 +33,18 @@ def get_product_reviews(
             detail="Product not found"
         )
     
-    reviews = db.query(Review).filter(Review.product_id == product_id).all()
-    
-    # Calculate average rating
-    avg_rating = 0.0
-    if reviews:
-        avg_rating = sum(r.rating for r in reviews) / len(reviews)
+    reviews = crud.get_product_reviews(db, product_id, sort=sort, limit=limit, cursor=cursor)
+    if len(reviews) == limit:
+        response.headers["X-Next-Cursor"] = str(reviews[-1].id)
     
+    # Summary from the aggregates maintained on the product; an untracked
+    # product (NULL rating_sum) has no reviews here yet
+    tracked = product.rating_sum is not None
     return ProductReviewsResponse(
         product_id=product_id,
-        average_rating=round(avg_rating, 1),
-        total_reviews=len(reviews),
+        average_rating=(product.rating_rate or 0.0) if tracked else 0.0,
+        total_reviews=(product.rating_count or 0) if tracked else 0,
+        rating_histogram=product.rating_histogram,
         reviews=reviews
     )
 
@@ -47,7 +52,7 @@ def get_product_reviews(
 @router.post("", response_model=ReviewResponse, status_code=status.HTTP_201_CREATED)
 def create_review(
     review: ReviewCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a review for a product."""
@@ -79,12 +84,10 @@ def create_review(
         comment=review.comment
     )
     db.add(db_review)
+    ratings.apply_review_change(db, review.product_id, None, review.rating)
     db.commit()
     db.refresh(db_review)
     
-    # Update product rating
-    _update_product_rating(db, review.product_id)
-    
     return db_review
 
 
@@ -92,7 +95,7 @@ def create_review(
 def update_review(
     review_id: int,
     review_update: ReviewUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a review."""
@@ -112,23 +115,22 @@ def update_review(
     
     # Update fields
     if review_update.rating is not None:
+        old_rating = db_review.rating
         db_review.rating = review_update.rating
+        ratings.apply_review_change(db, db_review.product_id, old_rating, review_update.rating)
     if review_update.comment is not None:
         db_review.comment = review_update.comment
     
     db.commit()
     db.refresh(db_review)
     
-    # Update product rating
-    _update_product_rating(db, db_review.product_id)
-    
     return db_review
 
 
 @router.delete("/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_review(
     review_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a review."""
@@ -146,35 +148,17 @@ def delete_review(
             detail="You can only delete your own reviews"
         )
     
-    product_id = db_review.product_id
     db.delete(db_review)
+    ratings.apply_review_change(db, db_review.product_id, db_review.rating, None)
     db.commit()
     
-    # Update product rating
-    _update_product_rating(db, product_id)
-    
     return None
 
 
 @router.get("/user/me", response_model=List[ReviewResponse])
 def get_my_reviews(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get all reviews by the current user."""
-    reviews = db.query(Review).filter(Review.user_id == current_user.id).all()
-    return reviews
-
-
-def _update_product_rating(db: Session, product_id: int):
-    """Helper function to update product's average rating."""
-    result = db.query(
-        func.avg(Review.rating).label('avg_rating'),
-        func.count(Review.id).label('count')
-    ).filter(Review.product_id == product_id).first()
-    
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product:
-        product.rating_rate = round(result.avg_rating or 0, 1)
-        product.rating_count = result.count or 0
-        db.commit()
+    return crud.get_user_reviews(db, current_user.id)
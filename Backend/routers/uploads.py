@@ -1,19 +1,24 @@
 """File upload router for Azure Blob Storage."""
+import importlib
 import uuid
 from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends
 from typing import List
 from pydantic import BaseModel
 
-from blob_storage import (
-    upload_file, delete_file, list_files, 
-    get_file_url, is_blob_storage_configured
-)
-from auth import get_current_user
-from models import User
+from auth import Principal, get_current_user
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
 
+def _storage():
+    """Import the blob storage module on first use rather than at startup."""
+    return importlib.import_module("blob_storage")
+
+
+def is_blob_storage_configured() -> bool:
+    return _storage().is_blob_storage_configured()
+
+
 class UploadResponse(BaseModel):
     """Response model for file upload."""
     filename: str
@@ -47,7 +52,7 @@ def get_storage_status():
 @router.post("/", response_model=UploadResponse)
 async def upload_image(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Upload a file to Azure Blob Storage.
@@ -77,7 +82,7 @@ async def upload_image(
     unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
     
     # Upload to Azure Blob
-    url = upload_file(
+    url = _storage().upload_file(
         file_data=file.file,
         filename=unique_filename,
         content_type=file.content_type
@@ -97,7 +102,7 @@ async def upload_image(
 
 
 @router.get("/", response_model=FileListResponse)
-def list_uploaded_files(current_user: User = Depends(get_current_user)):
+def list_uploaded_files(current_user: Principal = Depends(get_current_user)):
     """List all uploaded files. Requires authentication."""
     if not is_blob_storage_configured():
         raise HTTPException(
@@ -105,14 +110,14 @@ def list_uploaded_files(current_user: User = Depends(get_current_user)):
             detail="Azure Blob Storage is not configured"
         )
     
-    files = list_files()
+    files = _storage().list_files()
     return FileListResponse(files=files, count=len(files))
 
 
 @router.delete("/{filename}")
 def delete_uploaded_file(
     filename: str,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Delete a file from storage. Requires authentication."""
     if not is_blob_storage_configured():
@@ -121,7 +126,7 @@ def delete_uploaded_file(
             detail="Azure Blob Storage is not configured"
         )
     
-    success = delete_file(filename)
+    success = _storage().delete_file(filename)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -140,7 +145,7 @@ def get_uploaded_file_url(filename: str):
             detail="Azure Blob Storage is not configured"
         )
     
-    url = get_file_url(filename)
+    url = _storage().get_file_url(filename)
     if not url:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,10 +1,11 @@
 """User API endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 from database import get_db
-from auth import get_password_hash
-import crud, schemas, models
+from auth import get_password_hash_async
+import crud, schemas, models, outbox
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -24,16 +25,7 @@ def get_user(user_id: int, db: Session = Depends(get_db)):
     return user
 
 
-@router.post("/", response_model=schemas.UserResponse, status_code=201)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Create a new user."""
-    # Check if email already exists
-    existing = crud.get_user_by_email(db, user.email)
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Hash password and create user
-    hashed_password = get_password_hash(user.password)
+def _create_user(db: Session, user: schemas.UserCreate, hashed_password: str) -> models.User:
     db_user = models.User(
         email=user.email,
         name=user.name,
@@ -41,6 +33,21 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         is_active=1
     )
     db.add(db_user)
+    db.flush()  # Get user ID for the outbox event
+    outbox.enqueue(db, "user", db_user.id, "user.registered", {"user_id": db_user.id, "email": db_user.email})
     db.commit()
     db.refresh(db_user)
     return db_user
+
+
+@router.post("/", response_model=schemas.UserResponse, status_code=201)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Create a new user."""
+    # Check if email already exists
+    existing = await run_in_threadpool(crud.get_user_by_email, db, user.email)
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    # Hash password and create user
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
@@ -1,19 +1,25 @@
 """Wishlist router for user wishlists."""
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 
 from database import get_db
-from models import Wishlist, Product, User
-from schemas import WishlistItemCreate, WishlistItemResponse, WishlistResponse
-from auth import get_current_user
+from models import Wishlist, Product
+from schemas import (
+    WishlistItemCreate, WishlistItemResponse, WishlistResponse,
+    WishlistCheckRequest, WishlistCheckResponse
+)
+from auth import Principal, get_current_user
+import crud
 
 router = APIRouter(prefix="/wishlist", tags=["wishlist"])
 
 
 @router.get("", response_model=WishlistResponse)
 def get_wishlist(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get current user's wishlist."""
@@ -24,7 +30,7 @@ def get_wishlist(
 @router.post("", response_model=WishlistItemResponse, status_code=status.HTTP_201_CREATED)
 def add_to_wishlist(
     item: WishlistItemCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Add a product to the wishlist."""
@@ -36,25 +42,25 @@ def add_to_wishlist(
             detail="Product not found"
         )
     
-    # Check if already in wishlist
-    existing = db.query(Wishlist).filter(
-        Wishlist.user_id == current_user.id,
-        Wishlist.product_id == item.product_id
-    ).first()
-    
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Product already in wishlist"
-        )
-    
-    # Add to wishlist
+    # Add to wishlist; the unique index rejects duplicates even when this
+    # worker's cached wishlist is stale
     wishlist_item = Wishlist(
         user_id=current_user.id,
         product_id=item.product_id
     )
     db.add(wishlist_item)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        crud.wishlist_added(current_user.id, item.product_id)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Product already in wishlist"
+        )
+    crud.adjust_wishlist_count(db, item.product_id, 1)
     db.commit()
+    crud.wishlist_added(current_user.id, item.product_id)
     db.refresh(wishlist_item)
     
     return wishlist_item
@@ -63,36 +69,47 @@ def add_to_wishlist(
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remove_from_wishlist(
     product_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove a product from the wishlist."""
-    wishlist_item = db.query(Wishlist).filter(
+    # Only the request that actually deletes the row moves the count
+    deleted = db.execute(delete(Wishlist).where(
         Wishlist.user_id == current_user.id,
         Wishlist.product_id == product_id
-    ).first()
+    )).rowcount
     
-    if not wishlist_item:
+    if not deleted:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not in wishlist"
         )
     
-    db.delete(wishlist_item)
+    crud.adjust_wishlist_count(db, product_id, -1)
     db.commit()
+    crud.wishlist_removed(current_user.id, product_id)
     return None
 
 
+@router.post("/check", response_model=WishlistCheckResponse)
+def check_wishlist_batch(
+    check: WishlistCheckRequest,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Check many products against the user's wishlist in one query."""
+    wishlisted = crud.get_wishlisted_ids(db, current_user.id, check.product_ids)
+    return WishlistCheckResponse(
+        in_wishlist={product_id: product_id in wishlisted for product_id in check.product_ids}
+    )
+
+
 @router.get("/check/{product_id}")
 def check_wishlist(
     product_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Check if a product is in the user's wishlist."""
-    exists = db.query(Wishlist).filter(
-        Wishlist.user_id == current_user.id,
-        Wishlist.product_id == product_id
-    ).first() is not None
-    
-    return {"in_wishlist": exists}
+    return {"in_wishlist": product_id in crud.get_wishlist_ids(db, current_user.id)}
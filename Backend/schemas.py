@@ -1,7 +1,7 @@
 """Pydantic schemas for request/response validation."""
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Literal, Optional, List
+from datetime import date, datetime
 
 
 # Product schemas
@@ -13,6 +13,7 @@ class ProductBase(BaseModel):
     image: Optional[str] = None
     rating_rate: float = 0.0
     rating_count: int = 0
+    stock: Optional[int] = Field(None, ge=0, description="Units in stock; omit to not track inventory")
 
 
 class ProductCreate(ProductBase):
@@ -25,11 +26,15 @@ class ProductUpdate(BaseModel):
     description: Optional[str] = None
     category: Optional[str] = None
     image: Optional[str] = None
+    stock: Optional[int] = Field(None, ge=0)
 
 
 class ProductResponse(ProductBase):
     id: int
     created_at: datetime
+    rating_histogram: Optional[Dict[int, int]] = None
+    wishlist_count: int = 0
+    in_wishlist: Optional[bool] = None  # Only set on authenticated listings
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -88,7 +93,7 @@ class CartItemCreate(CartItemBase):
 
 
 class CartItemResponse(CartItemBase):
-    id: int
+    id: Optional[int] = None  # None until a memory-first cart line is persisted
     product: ProductResponse
 
     model_config = ConfigDict(from_attributes=True)
@@ -99,10 +104,22 @@ class CartResponse(BaseModel):
     total: float
 
 
+class CartSummary(BaseModel):
+    count: int = 0  # distinct lines
+    quantity: int = 0
+    total: float = 0.0
+
+
+class CartBulkUpdate(BaseModel):
+    set: List[CartItemBase] = Field(default_factory=list, description="Lines to set to an exact quantity (<= 0 removes)")
+    increment: List[CartItemBase] = Field(default_factory=list, description="Lines to add to")
+    remove: List[int] = Field(default_factory=list, description="Product IDs to remove")
+
+
 # Order schemas
 class OrderItemBase(BaseModel):
     product_id: int
-    quantity: int = 1
+    quantity: int = Field(1, ge=1)
 
 
 class OrderItemResponse(OrderItemBase):
@@ -117,6 +134,26 @@ class OrderCreate(BaseModel):
     items: List[OrderItemBase]
 
 
+class StockFailure(BaseModel):
+    product_id: int
+    requested: int
+    available: int
+
+
+OrderStatus = Literal["pending", "completed", "cancelled"]
+
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    expected_status: OrderStatus
+    status: OrderStatus
+
+
+class OrderStatusBulkResult(BaseModel):
+    updated: List[int]  # Orders moved from expected_status to status
+    skipped: List[int]  # Missing, archived or not in expected_status
+
+
 class OrderResponse(BaseModel):
     id: int
     user_id: int
@@ -147,6 +184,14 @@ class WishlistResponse(BaseModel):
     count: int
 
 
+class WishlistCheckRequest(BaseModel):
+    product_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class WishlistCheckResponse(BaseModel):
+    in_wishlist: Dict[int, bool]  # product_id -> membership
+
+
 # Review schemas
 class ReviewBase(BaseModel):
     rating: int = Field(..., ge=1, le=5, description="Rating from 1 to 5 stars")
@@ -162,12 +207,20 @@ class ReviewUpdate(BaseModel):
     comment: Optional[str] = Field(None, max_length=1000)
 
 
+class ReviewAuthor(BaseModel):
+    """Public view of a review's author; never includes the email."""
+    id: int
+    name: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class ReviewResponse(ReviewBase):
     id: int
     user_id: int
     product_id: int
     created_at: datetime
-    user: Optional[UserResponse] = None
+    user: Optional[ReviewAuthor] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -176,5 +229,18 @@ class ProductReviewsResponse(BaseModel):
     product_id: int
     average_rating: float
     total_reviews: int
+    rating_histogram: Dict[int, int]
     reviews: List[ReviewResponse]
 
+
+# Analytics schemas
+class SalesRollupResponse(BaseModel):
+    day: date
+    dimension: str
+    key: str
+    revenue: float
+    units: int
+    orders: int
+
+    model_config = ConfigDict(from_attributes=True)
+
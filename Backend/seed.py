@@ -1,6 +1,6 @@
 """Seed script to populate database with sample data from FakeStoreAPI."""
 import requests
-from database import SessionLocal, engine, Base
+from database import SessionLocal, init_db
 from models import Product
 
 # FakeStoreAPI endpoint - can be changed to any compatible API
@@ -9,8 +9,8 @@ FAKE_STORE_API_URL = "https://fakestoreapi.com/products"
 
 def seed_products(api_url: str = FAKE_STORE_API_URL):
     """Fetch products from fake API and insert into database."""
-    # Ensure tables exist
-    Base.metadata.create_all(bind=engine)
+    # Ensure tables exist (no-op when the schema version is current)
+    init_db()
     
     db = SessionLocal()
     
@@ -0,0 +1,95 @@
+"""
+Product wishlist counts.
+
+Each product keeps a wishlist_count, moved by one atomic UPDATE in the same
+transaction as the wishlist row it counts, so "most wished-for" listings read
+the ix_products_wishlist_count index instead of grouping the wishlists table.
+
+Rebuild recomputes the counts from the wishlists table per product-ID range,
+for products that existed before the column or to repair drift:
+
+    cd Backend && python -m wishlist_counts [--range-size 1000] [--dry-run]
+"""
+import argparse
+from typing import Tuple
+
+from sqlalchemy import and_, bindparam, func, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+import models
+
+REBUILD_RANGE_SIZE = 1000
+
+
+def _rebuild_range(db: Session, low: int, high: int, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Recompute counts for products with low <= id < high in one transaction.
+
+    Returns (products checked, products corrected).
+    """
+    # Lock the products first so wishlist writes in the range queue behind us
+    # and apply their delta on top of the recomputed count
+    current = dict(db.execute(
+        select(models.Product.id, models.Product.wishlist_count)
+        .where(and_(models.Product.id >= low, models.Product.id < high))
+        .with_for_update()
+    ).all())
+    actual = dict(db.execute(
+        select(models.Wishlist.product_id, func.count(models.Wishlist.id))
+        .where(models.Wishlist.product_id >= low, models.Wishlist.product_id < high)
+        .group_by(models.Wishlist.product_id)
+    ).all())
+
+    rows = [
+        {"product_id": product_id, "wishlist_count": actual.get(product_id, 0)}
+        for product_id, stored in current.items()
+        if stored != actual.get(product_id, 0)
+    ]
+    if rows and not dry_run:
+        table = models.Product.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("product_id"))
+            .values(wishlist_count=bindparam("wishlist_count")),
+            rows
+        )
+        db.commit()
+    else:
+        db.rollback()
+    return len(current), len(rows)
+
+
+def rebuild(db: Session, range_size: int = REBUILD_RANGE_SIZE, dry_run: bool = False) -> int:
+    """
+    Recompute wishlist counts from the wishlists, one product-ID range per transaction.
+
+    Returns the number of products corrected (or that would be, with dry_run).
+    """
+    low, high = db.execute(select(func.min(models.Product.id), func.max(models.Product.id))).one()
+    db.rollback()
+    if low is None:
+        return 0
+    corrected = 0
+    for start in range(low, high + 1, range_size):
+        corrected += _rebuild_range(db, start, start + range_size, dry_run)[1]
+    return corrected
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recompute product wishlist counts from the wishlists.")
+    parser.add_argument("--range-size", type=int, default=REBUILD_RANGE_SIZE, help="product IDs per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        corrected = rebuild(db, args.range_size, args.dry_run)
+        verb = "Would correct" if args.dry_run else "Corrected"
+        print(f"{verb} wishlist counts on {corrected} products")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
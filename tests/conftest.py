@@ -9,8 +9,9 @@ if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 
 import pytest
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -18,6 +19,8 @@ from sqlalchemy.pool import StaticPool
 from database import Base, get_db
 from main import app
 import models
+import auth
+import crud
 from auth import get_password_hash
 
 # Test database (in-memory SQLite)
@@ -42,6 +45,15 @@ def override_get_db():
 app.dependency_overrides[get_db] = override_get_db
 
 
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """Drop in-process caches so IDs reused across tests never hit stale entries."""
+    crud.cart_summary_cache.clear()
+    crud.wishlist_ids_cache.clear()
+    auth.principal_cache.clear()
+    yield
+
+
 @pytest.fixture(scope="function")
 def db():
     """Create a fresh database session for each test."""
@@ -60,6 +72,25 @@ def client(db):
     Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def count_queries():
+    """Return a context manager collecting SQL statements run on the test engine."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
 @pytest.fixture
 def test_user(db):
     """Create a test user and return it."""
@@ -105,6 +136,13 @@ def auth_headers(client, test_user):
     return {"Authorization": f"Bearer {token}"}
 
 
+@pytest.fixture
+def admin_headers(auth_headers, test_user, monkeypatch):
+    """Authentication headers for the test user, configured as an admin."""
+    monkeypatch.setattr(auth, "ADMIN_USER_IDS", frozenset({test_user.id}))
+    return auth_headers
+
+
 @pytest.fixture
 def multiple_products(db):
     """Create multiple test products."""
@@ -0,0 +1,126 @@
+"""Tests for archiving old orders out of the hot tables."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import crud
+import models
+import rollups
+import schemas
+from auth import create_access_token
+
+
+def _order(db, user, product, status="completed", age_days=0):
+    order = crud.create_order(db, user.id, [schemas.OrderItemBase(product_id=product.id, quantity=2)])
+    order.status = status
+    order.created_at = datetime.utcnow() - timedelta(days=age_days)
+    db.commit()
+    return order.id
+
+
+@pytest.fixture
+def history(db, test_user, test_product):
+    """Two archivable orders, one old pending order and one recent order."""
+    return {
+        "oldest": _order(db, test_user, test_product, "completed", 800),
+        "old_cancelled": _order(db, test_user, test_product, "cancelled", 500),
+        "old_pending": _order(db, test_user, test_product, "pending", 600),
+        "recent": _order(db, test_user, test_product, "completed", 1),
+    }
+
+
+class TestArchiveJob:
+    """Test the archive job moves only eligible orders."""
+
+    def test_moves_old_finished_orders(self, db, history):
+        """Test old completed/cancelled orders and their items move to the archive."""
+        assert archive.archive_orders(db) == 2
+
+        hot = {id for (id,) in db.query(models.Order.id)}
+        cold = {id for (id,) in db.query(models.ArchivedOrder.id)}
+        assert hot == {history["old_pending"], history["recent"]}
+        assert cold == {history["oldest"], history["old_cancelled"]}
+        assert db.query(models.OrderItem).filter(models.OrderItem.order_id.in_(cold)).count() == 0
+        assert db.query(models.ArchivedOrderItem).count() == 2
+        assert {item.category for item in db.query(models.ArchivedOrderItem)} == {"electronics"}
+
+    def test_batches_and_rerun(self, db, history):
+        """Test batches are bounded and a re-run picks up where it stopped."""
+        assert archive.archive_orders(db, batch_size=1, max_batches=1) == 1
+        assert archive.archive_orders(db, batch_size=1) == 1
+        assert archive.archive_orders(db) == 0
+
+    def test_keeps_newest_order(self, db, test_user, test_product):
+        """Test the highest order ID stays hot so SQLite cannot reuse it."""
+        only = _order(db, test_user, test_product, "completed", 800)
+
+        assert archive.archive_orders(db) == 0
+        assert db.get(models.Order, only) is not None
+
+    def test_rejects_age_below_horizon(self, db):
+        """Test archiving newer than reads assume is refused."""
+        with pytest.raises(ValueError):
+            archive.archive_orders(db, older_than_days=archive.ORDER_ARCHIVE_AFTER_DAYS - 1)
+
+
+class TestArchivedReads:
+    """Test order reads fall back to the archive."""
+
+    def test_get_order_falls_back(self, db, history):
+        """Test an archived order can still be looked up with its items."""
+        archive.archive_orders(db)
+
+        order = crud.get_order(db, history["oldest"])
+
+        assert isinstance(order, models.ArchivedOrder)
+        assert order.items[0].product.title == "Test Product"
+        assert crud.update_order_status(db, history["oldest"], "pending") is None
+
+    def test_history_merges_hot_and_archived(self, db, test_user, history):
+        """Test paging walks both tables in one (created_at, id) order."""
+        expected = crud.get_orders(db, test_user.id)
+        archive.archive_orders(db)
+
+        seen, cursor = [], None
+        while True:
+            page = crud.get_orders(db, test_user.id, limit=1, cursor=cursor)
+            if not page:
+                break
+            seen += [order.id for order in page]
+            cursor = page[-1].id
+
+        assert seen == [order.id for order in expected]
+        assert seen == [history["recent"], history["old_cancelled"], history["old_pending"], history["oldest"]]
+
+    def test_recent_full_page_skips_archive(self, db, test_user, history, count_queries):
+        """Test a full page of recent orders never touches the archive."""
+        archive.archive_orders(db)
+
+        with count_queries() as statements:
+            page = crud.get_orders(db, test_user.id, limit=1)
+
+        assert [order.id for order in page] == [history["recent"]]
+        assert not any("orders_archive" in statement for statement in statements)
+
+    def test_api_serves_archived_order(self, client, db, test_user, history):
+        """Test GET /orders/{id} returns an archived order."""
+        archive.archive_orders(db)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"}
+
+        response = client.get(f"/orders/{history['oldest']}", headers=headers)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "completed"
+        assert len(response.json()["items"]) == 1
+
+    def test_rollup_rebuild_counts_archive(self, db, history):
+        """Test rebuilt rollups still include archived orders."""
+        archive.archive_orders(db)
+
+        # oldest, old_pending and recent; the cancelled one is excluded
+        assert rollups.rebuild(db) == 3
@@ -8,7 +8,11 @@ from datetime import timedelta
 from jose import jwt, JWTError
 from fastapi import HTTPException
 
+import asyncio
+import threading
+
 import auth
+import hashing
 import models
 
 
@@ -188,3 +192,120 @@ class TestAuthConfiguration:
     def test_token_expire_minutes_is_set(self):
         """Test that token expiration is configured."""
         assert auth.ACCESS_TOKEN_EXPIRE_MINUTES > 0
+
+
+class TestHashingPool:
+    """Test password hashing runs on a bounded pool."""
+
+    @pytest.fixture
+    def blocked_hasher(self):
+        """A one-slot hasher whose only slot is held until the test releases it."""
+        started, release = threading.Event(), threading.Event()
+        hasher = hashing.PasswordHasher(auth.pwd_context, workers=1, queue_limit=0)
+        holder = threading.Thread(target=hasher._run, args=("hash", lambda: started.set() or release.wait()))
+        holder.start()
+        started.wait()
+        yield hasher
+        release.set()
+        holder.join()
+        hasher.shutdown()
+
+    def test_runs_off_caller_thread(self):
+        """Test hashes are computed on the dedicated pool."""
+        hasher = hashing.PasswordHasher(auth.pwd_context, workers=1, queue_limit=0)
+        assert hasher._run("hash", lambda: threading.current_thread().name).startswith("password-hash")
+        assert hasher.verify("secret", hasher.hash("secret"))
+        hasher.shutdown()
+
+    def test_saturated_pool_rejects(self, blocked_hasher):
+        """Test calls past the admission limit fail immediately."""
+        with pytest.raises(hashing.PasswordHasherBusy):
+            blocked_hasher.hash("secret")
+
+    def test_async_wait_leaves_event_loop_free(self):
+        """Test awaiting a hash keeps the loop running and holds the slot until the hash ends."""
+        hasher = hashing.PasswordHasher(auth.pwd_context, workers=1, queue_limit=0)
+        release = threading.Event()
+
+        async def scenario():
+            slow = asyncio.ensure_future(
+                hasher._run_async("hash", lambda: release.wait(5) and threading.current_thread().name)
+            )
+            await asyncio.sleep(0.01)  # the loop keeps serving while the hash runs
+            assert not slow.done()
+            with pytest.raises(hashing.PasswordHasherBusy):
+                await hasher.hash_async("secret")
+
+            # A caller that gives up does not free the slot its hash still occupies
+            slow.cancel()
+            await asyncio.sleep(0)
+            with pytest.raises(hashing.PasswordHasherBusy):
+                await hasher.hash_async("secret")
+            release.set()
+            await asyncio.wrap_future(hasher._pool.submit(lambda: None))  # queued behind the slow hash
+            return await hasher._run_async("hash", lambda: threading.current_thread().name)
+
+        assert asyncio.run(scenario()).startswith("password-hash")
+        hasher.shutdown()
+
+    def test_login_returns_503_when_saturated(self, client, test_user, blocked_hasher, monkeypatch):
+        """Test a saturated pool turns logins away with a retryable 503."""
+        monkeypatch.setattr(auth, "password_hasher", blocked_hasher)
+
+        response = client.post("/auth/login/json", json={"email": test_user.email, "password": "testpassword123"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+class TestPrincipalCache:
+    """Test resolved principals are cached and invalidated."""
+
+    def _user_queries(self, statements):
+        return [s for s in statements if "FROM users" in s]
+
+    def test_repeat_requests_skip_user_query(self, client, auth_headers, count_queries):
+        """Test only the first request with a token loads the user."""
+        client.get("/wishlist", headers=auth_headers)
+
+        with count_queries() as statements:
+            assert client.get("/wishlist", headers=auth_headers).status_code == 200
+
+        assert self._user_queries(statements) == []
+
+    def test_tokens_are_cached_separately(self, client, test_user):
+        """Test each token ID gets its own entry."""
+        for _ in range(2):
+            headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': str(test_user.id)})}"}
+            client.get("/wishlist", headers=headers)
+
+        assert len(auth.principal_cache) == 2
+
+    def test_deactivation_invalidates(self, client, db, test_user, auth_headers):
+        """Test committing is_active=False takes effect on the next request."""
+        assert client.get("/wishlist", headers=auth_headers).status_code == 200
+
+        test_user.is_active = False
+        db.commit()
+
+        assert client.get("/wishlist", headers=auth_headers).status_code == 400
+
+    def test_deletion_invalidates(self, client, db, test_user, auth_headers):
+        """Test a deleted user's cached principal stops authenticating."""
+        assert client.get("/wishlist", headers=auth_headers).status_code == 200
+
+        db.delete(test_user)
+        db.commit()
+
+        assert client.get("/wishlist", headers=auth_headers).status_code == 401
+
+    def test_rolled_back_change_keeps_entry(self, client, db, test_user, auth_headers):
+        """Test a change that never commits does not invalidate."""
+        client.get("/wishlist", headers=auth_headers)
+
+        test_user.name = "Renamed"
+        db.flush()
+        db.rollback()
+
+        assert len(auth.principal_cache) == 1
+
@@ -0,0 +1,143 @@
+"""Tests for the in-process LRU cache."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+from cache import IntSet, LRUCache
+
+
+class TestLRUCache:
+    """Test LRU eviction, TTL and invalidation."""
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest untouched entry is evicted first."""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+
+    def test_pop_where_drops_matching_keys(self):
+        """Test predicate invalidation removes only the matching entries."""
+        cache = LRUCache()
+        cache.set((1, "a"), 1)
+        cache.set((1, "b"), 2)
+        cache.set((2, "a"), 3)
+        cache.pop_where(lambda key: key[0] == 1)
+
+        assert len(cache) == 1
+        assert (2, "a") in cache
+
+    def test_ttl_expires_entries(self):
+        """Test entries past their TTL are treated as misses."""
+        cache = LRUCache(ttl=-1)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+    def test_get_or_load_caches_result(self):
+        """Test the loader only runs on a miss."""
+        cache = LRUCache()
+        calls = []
+        loader = lambda: calls.append(1) or "value"
+
+        assert cache.get_or_load("k", loader) == "value"
+        assert cache.get_or_load("k", loader) == "value"
+        assert len(calls) == 1
+
+    def test_invalidation_during_load_is_not_overwritten(self):
+        """Test a value loaded before an invalidation is not cached."""
+        cache = LRUCache()
+
+        def loader():
+            cache.pop("k")  # a concurrent write lands mid-load
+            return "stale"
+
+        assert cache.get_or_load("k", loader) == "stale"
+        assert "k" not in cache
+
+    def test_update_replaces_cached_value_only(self):
+        """Test update applies to cached entries and ignores misses."""
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.update("a", lambda v: v + 1)
+        cache.update("b", lambda v: v + 1)
+
+        assert cache.get("a") == 2
+        assert "b" not in cache
+
+    def test_update_during_load_is_not_overwritten(self):
+        """Test an update mid-load keeps the stale loaded value out."""
+        cache = LRUCache()
+
+        def loader():
+            cache.update("k", lambda v: v)
+            return "stale"
+
+        cache.get_or_load("k", loader)
+        assert "k" not in cache
+
+    def test_invalidating_other_key_during_load_keeps_value(self):
+        """Test a load survives invalidations of unrelated keys."""
+        cache = LRUCache()
+        cache.set("b", 1)
+
+        def loader():
+            cache.pop("b")
+            cache.pop_where(lambda key: key == "c")
+            cache.update("d", lambda v: v)
+            return "fresh"
+
+        assert cache.get_or_load("a", loader) == "fresh"
+        assert cache.get("a") == "fresh"
+        assert "b" not in cache
+
+    def test_pop_where_during_load_is_not_overwritten(self):
+        """Test a predicate invalidation also reaches keys still loading."""
+        cache = LRUCache()
+
+        def loader():
+            cache.pop_where(lambda key: key[0] == 1)
+            return "stale"
+
+        cache.get_or_load((1, "x"), loader)
+        assert (1, "x") not in cache
+
+    def test_clear_during_load_is_not_overwritten(self):
+        """Test clear cancels every in-flight load."""
+        cache = LRUCache()
+
+        def loader():
+            cache.clear()
+            return "stale"
+
+        cache.get_or_load("k", loader)
+        assert "k" not in cache
+
+
+class TestIntSet:
+    """Test the array-backed integer set."""
+
+    def test_membership(self):
+        """Test members are found and non-members are not."""
+        ids = IntSet([5, 1, 3, 3])
+        assert list(ids) == [1, 3, 5]
+        assert 3 in ids
+        assert 4 not in ids
+        assert 6 not in ids
+        assert len(ids) == 3
+
+    def test_add_and_discard_return_new_sets(self):
+        """Test changes leave the original untouched."""
+        ids = IntSet([2, 4])
+        added = ids.add(3)
+        removed = added.discard(2)
+
+        assert list(ids) == [2, 4]
+        assert list(added) == [2, 3, 4]
+        assert list(removed) == [3, 4]
+        assert added.add(3) is added
+        assert removed.discard(9) is removed
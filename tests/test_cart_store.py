@@ -0,0 +1,156 @@
+"""Tests for the pluggable cart stores."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+import pytest
+
+import models
+import schemas
+from main import app
+from auth import create_access_token
+from cart_store import MemoryCartStore, SqlCartStore, get_cart_store
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def memory_store(db):
+    """Serve the API from a memory-first store that only flushes on demand."""
+    store = MemoryCartStore(session_factory=TestingSessionLocal, flush_interval=None)
+    app.dependency_overrides[get_cart_store] = lambda: store
+    yield store
+    app.dependency_overrides.pop(get_cart_store, None)
+
+
+class TestMemoryCartStore:
+    """Test the memory-first store with write-behind persistence."""
+
+    def test_writes_are_deferred_until_flush(self, db, memory_store, test_user, test_product):
+        """Test cart writes stay in memory until the store flushes."""
+        memory_store.add(db, test_user.id, test_product.id, 2)
+        memory_store.add(db, test_user.id, test_product.id, 1)
+
+        assert db.query(models.CartItem).count() == 0
+        assert memory_store.pending() == 1
+
+        memory_store.flush_all()
+
+        rows = db.query(models.CartItem).all()
+        assert [(row.product_id, row.quantity) for row in rows] == [(test_product.id, 3)]
+        assert memory_store.pending() == 0
+
+    def test_loads_existing_cart_from_database(self, db, memory_store, test_user, test_product):
+        """Test a cart persisted earlier is read back on first access."""
+        SqlCartStore().add(db, test_user.id, test_product.id, 4)
+
+        items = memory_store.get_items(db, test_user.id)
+
+        assert [(item.product_id, item.quantity) for item in items] == [(test_product.id, 4)]
+        assert memory_store.get_total(db, test_user.id) == pytest.approx(test_product.price * 4)
+
+    def test_bulk_update_and_clear(self, db, memory_store, test_user, multiple_products):
+        """Test bulk changes and clearing are reflected after a flush."""
+        p1, p2, p3 = [p.id for p in multiple_products[:3]]
+        memory_store.add(db, test_user.id, p1, 1)
+        memory_store.bulk_update(db, test_user.id, schemas.CartBulkUpdate(
+            set=[schemas.CartItemBase(product_id=p2, quantity=3)],
+            increment=[schemas.CartItemBase(product_id=p3, quantity=2)],
+            remove=[p1],
+        ))
+        memory_store.flush_all()
+        quantities = {row.product_id: row.quantity for row in db.query(models.CartItem).all()}
+        assert quantities == {p2: 3, p3: 2}
+
+        memory_store.clear(db, test_user.id)
+        memory_store.flush_all()
+        assert db.query(models.CartItem).count() == 0
+
+    def test_small_store_keeps_every_write(self, db, test_user, multiple_products):
+        """Test carts evicted to stay within max_users never lose a change."""
+        other = models.User(email="other@test.com", password_hash="x")
+        db.add(other)
+        db.commit()
+        store = MemoryCartStore(session_factory=TestingSessionLocal, flush_interval=None, max_users=1)
+
+        for product in multiple_products[:3]:
+            store.add(db, test_user.id, product.id, 1)
+            store.flush_all()
+            store.add(db, other.id, product.id, 2)
+            store.flush_all()
+
+        quantities = {
+            (row.user_id, row.product_id): row.quantity for row in db.query(models.CartItem)
+        }
+        assert sum(q for (user, _), q in quantities.items() if user == test_user.id) == 3
+        assert sum(q for (user, _), q in quantities.items() if user == other.id) == 6
+
+    def test_flush_skips_deleted_products(self, db, memory_store, test_user, multiple_products):
+        """Test lines for products deleted before the flush are dropped, not retried forever."""
+        kept, gone = multiple_products[:2]
+        memory_store.add(db, test_user.id, kept.id, 1)
+        memory_store.add(db, test_user.id, gone.id, 1)
+        db.delete(gone)
+        db.commit()
+
+        memory_store.flush_all()
+
+        assert [row.product_id for row in db.query(models.CartItem)] == [kept.id]
+        assert memory_store.pending() == 0
+
+    def test_failing_cart_does_not_block_batch(self, db, memory_store, test_user, test_product, monkeypatch):
+        """Test a cart that cannot be written is retried alone while the rest persist."""
+        other = models.User(email="other@test.com", password_hash="x")
+        db.add(other)
+        db.commit()
+        memory_store.add(db, test_user.id, test_product.id, 1)
+        memory_store.add(db, other.id, test_product.id, 2)
+        write = memory_store._write
+
+        def failing_write(session, snapshot):
+            if test_user.id in snapshot:
+                raise RuntimeError("boom")
+            write(session, snapshot)
+        monkeypatch.setattr(memory_store, "_write", failing_write)
+
+        memory_store.flush_all()
+
+        assert [row.user_id for row in db.query(models.CartItem)] == [other.id]
+        assert memory_store.pending() == 1
+
+    def test_flusher_survives_errors(self, db, test_user, test_product, monkeypatch):
+        """Test an exception in one flush does not stop the background thread."""
+        import time
+        store = MemoryCartStore(session_factory=TestingSessionLocal, flush_interval=0.01)
+        flush_all = store.flush_all
+        calls = []
+
+        def flaky_flush_all():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("boom")
+            flush_all()
+        monkeypatch.setattr(store, "flush_all", flaky_flush_all)
+
+        store.add(db, test_user.id, test_product.id, 1)
+        deadline = time.monotonic() + 5
+        while store.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert store.pending() == 0
+        store.close()
+
+    def test_checkout_sees_unflushed_cart(self, client, db, memory_store, test_user, test_product):
+        """Test checkout reads the in-memory cart even before it is persisted."""
+        token = create_access_token({"sub": str(test_user.id)})
+        headers = {"Authorization": f"Bearer {token}", "X-User-ID": str(test_user.id)}
+
+        response = client.post("/cart/items", json={"product_id": test_product.id, "quantity": 2}, headers=headers)
+        assert response.status_code == 201
+
+        response = client.post("/orders/from-cart", headers=headers)
+        assert response.status_code == 201
+        assert response.json()["items"][0]["quantity"] == 2
+
+        assert client.get("/cart/", headers=headers).json()["items"] == []
+        memory_store.flush_all()
+        assert db.query(models.CartItem).count() == 0
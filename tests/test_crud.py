@@ -196,6 +196,34 @@ class TestCartCRUD:
         
         assert cart_item.quantity == 5  # 2 + 3
 
+    def test_add_to_cart_is_single_upsert(self, db, test_user, test_product, count_queries):
+        """Test adding to an existing line is one statement and keeps one row."""
+        user_id, product_id = test_user.id, test_product.id
+        item_data = schemas.CartItemCreate(product_id=product_id, quantity=1)
+        crud.add_to_cart(db, user_id, item_data)
+
+        with count_queries() as statements:
+            crud.add_to_cart(db, user_id, item_data)
+
+        assert len(statements) == 1
+        assert "ON CONFLICT" in statements[0]
+        items = crud.get_cart_items(db, user_id)
+        assert len(items) == 1
+        assert items[0].quantity == 2
+
+    def test_cart_line_is_unique_per_product(self, db, test_user, test_product):
+        """Test the database rejects duplicate cart lines."""
+        db.add_all([
+            models.CartItem(user_id=test_user.id, product_id=test_product.id, quantity=1),
+            models.CartItem(user_id=test_user.id, product_id=test_product.id, quantity=1),
+        ])
+        with pytest.raises(Exception):  # IntegrityError
+            db.commit()
+
+    def test_update_cart_item_missing_returns_none(self, db, test_user, test_product):
+        """Test updating a product that is not in the cart."""
+        assert crud.update_cart_item(db, test_user.id, test_product.id, 3) is None
+
     def test_get_cart_items(self, db, test_user, multiple_products):
         """Test getting all cart items for a user."""
         # Add multiple items to cart
@@ -268,6 +296,40 @@ class TestOrderCRUD:
         assert order.status == "pending"
         assert order.total == test_product.price * 2
 
+    def test_create_order_stamps_aware_utc(self, db, test_user, test_product):
+        """Test created_at is written as an aware UTC timestamp, matching its column type."""
+        from datetime import timezone
+        from sqlalchemy import event
+
+        stamped = []
+        capture = lambda mapper, connection, target: stamped.append(target.created_at)
+        event.listen(models.Order, "before_insert", capture)
+        try:
+            crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=test_product.id, quantity=1)])
+        finally:
+            event.remove(models.Order, "before_insert", capture)
+
+        assert stamped[0].tzinfo is timezone.utc
+
+    def test_create_order_query_count_is_flat(self, db, test_user, count_queries):
+        """Test order creation costs the same number of queries for 2 or 20 lines."""
+        products = [models.Product(title=f"P{i}", price=1.0, category="bulk") for i in range(20)]
+        db.add_all(products)
+        db.commit()
+        user_id = test_user.id
+        product_ids = [p.id for p in products]
+
+        counts = []
+        for size in (2, 20):
+            items = [schemas.OrderItemBase(product_id=pid, quantity=1) for pid in product_ids[:size]]
+            with count_queries() as statements:
+                order = crud.create_order(db, user_id, items)
+            counts.append(len(statements))
+            assert order.total == float(size)
+            assert len(order.items) == size
+
+        assert counts[0] == counts[1]
+
     def test_create_order_multiple_items(self, db, test_user, multiple_products):
         """Test creating an order with multiple items."""
         items = [
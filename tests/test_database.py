@@ -204,3 +204,146 @@ class TestModels:
             models.OrderItem.id == order_item_id
         ).first()
         assert deleted_item is None
+
+
+class TestSchemaInit:
+    """Test startup schema management."""
+
+    def _engine(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import StaticPool
+        return create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+
+    def test_init_db_creates_and_stamps(self):
+        """Test first startup creates tables and stamps the version."""
+        engine = self._engine()
+        assert database.init_db(bind=engine, mode="create") == "created"
+        assert database.get_schema_version(engine) == database.SCHEMA_VERSION
+        assert inspect(engine).has_table("products")
+
+    def test_init_db_fast_path_when_current(self):
+        """Test later startups skip create_all when the version matches."""
+        engine = self._engine()
+        database.init_db(bind=engine, mode="create")
+        assert database.init_db(bind=engine, mode="create") == "current"
+
+    def test_init_db_check_mode_rejects_unstamped(self):
+        """Test check mode refuses to start against an unmanaged schema."""
+        engine = self._engine()
+        with pytest.raises(RuntimeError):
+            database.init_db(bind=engine, mode="check")
+
+    def test_init_db_skip_mode(self):
+        """Test skip mode does not touch the database."""
+        engine = self._engine()
+        assert database.init_db(bind=engine, mode="skip") == "skipped"
+        assert not inspect(engine).has_table("products")
+
+    def test_init_db_adds_missing_columns(self):
+        """Test an older database gains new nullable columns on upgrade."""
+        from sqlalchemy import text
+        engine = self._engine()
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, title VARCHAR(200), price FLOAT)"))
+
+        assert database.init_db(bind=engine, mode="create") == "created"
+
+        columns = {c["name"] for c in inspect(engine).get_columns("products")}
+        assert {"stock", "rating_rate", "category"} <= columns
+        with engine.connect() as conn:
+            conn.execute(text("INSERT INTO products (id, title, price) VALUES (1, 'P', 1.0)"))
+            assert conn.execute(text("SELECT category, stars_1 FROM products")).one() == ("general", 0)
+
+    def test_default_literal_is_rendered_for_dialect(self):
+        """Test added-column defaults are quoted by the dialect, not by repr()."""
+        from sqlalchemy import Boolean, Column, String
+        from sqlalchemy.dialects import postgresql, sqlite
+
+        quoted = Column("note", String(20), default="it's")
+        flag = Column("flag", Boolean, default=True)
+
+        assert database._default_literal(quoted, sqlite.dialect()) == "'it''s'"
+        assert database._default_literal(flag, sqlite.dialect()) == "1"
+        assert database._default_literal(flag, postgresql.dialect()) == "true"
+        assert database._default_literal(Column("plain", String(20)), sqlite.dialect()) is None
+
+    def test_init_db_adds_cart_unique_index(self):
+        """Test an older cart table is de-duplicated and gains the upsert index."""
+        from sqlalchemy import text
+        from sqlalchemy.orm import Session
+        import crud
+        import schemas
+
+        engine = self._engine()
+        database.Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX uq_cart_items_user_product"))
+            conn.execute(text("INSERT INTO cart_items (user_id, product_id, quantity) VALUES (1, 1, 2), (1, 1, 3), (1, 2, 1)"))
+
+        assert database.init_db(bind=engine, mode="create") == "created"
+
+        with Session(engine) as db:
+            item = crud.add_to_cart(db, 1, schemas.CartItemCreate(product_id=1, quantity=1))
+            assert item.quantity == 6
+            assert db.query(models.CartItem).count() == 2
+
+    def test_init_db_dedupes_wishlists(self):
+        """Test an older wishlist table loses duplicates and is recounted on upgrade."""
+        from sqlalchemy import text
+        from sqlalchemy.orm import Session
+
+        engine = self._engine()
+        database.Base.metadata.create_all(bind=engine)
+        with Session(engine) as db:
+            db.add(models.Product(id=1, title="P", price=1.0, category="misc", wishlist_count=2))
+            db.commit()
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX uq_wishlists_user_product"))
+            conn.execute(text("INSERT INTO wishlists (user_id, product_id) VALUES (1, 1), (1, 1)"))
+
+        assert database.init_db(bind=engine, mode="create") == "created"
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM wishlists")).scalar() == 1
+            assert conn.execute(text("SELECT wishlist_count FROM products")).scalar() == 1
+        assert "uq_wishlists_user_product" in {ix["name"] for ix in inspect(engine).get_indexes("wishlists")}
+
+    @pytest.mark.parametrize("existing", [False, True], ids=["fresh", "upgrade"])
+    def test_init_db_concurrent_workers(self, tmp_path, existing):
+        """Test workers starting together set up or upgrade the schema once without errors."""
+        import multiprocessing
+        from sqlalchemy import create_engine, text
+
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(6)
+        results = context.Queue()
+        url = f"sqlite:///{tmp_path / 'race.db'}"
+        if existing:
+            with create_engine(url).begin() as conn:
+                conn.execute(text("CREATE TABLE products (id INTEGER PRIMARY KEY, title VARCHAR(200), price FLOAT)"))
+        workers = [context.Process(target=_init_db_worker, args=(url, barrier, results)) for _ in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+
+        outcomes = sorted(results.get(timeout=5) for _ in workers)
+        assert outcomes == ["created"] + ["current"] * 5
+        if existing:
+            columns = {c["name"] for c in inspect(create_engine(url)).get_columns("products")}
+            assert {"stock", "category", "wishlist_count"} <= columns
+
+
+def _init_db_worker(url, barrier, results):
+    from sqlalchemy import create_engine
+
+    engine = create_engine(url)
+    barrier.wait()
+    try:
+        results.put(database.init_db(bind=engine, mode="create"))
+    except Exception as e:
+        results.put(f"error: {e}")
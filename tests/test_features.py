@@ -305,3 +305,284 @@ class TestReviews:
         
         response = client.get(f"/reviews/product/{product.id}")
         assert response.status_code == 200
+
+
+class TestReviewPagination:
+    """Tests for paginated, sorted product reviews."""
+
+    @pytest.fixture
+    def reviewed_product(self, db):
+        """A product with ratings 1..5 by distinct users, rating 3 newest."""
+        from datetime import datetime, timedelta
+        product = Product(title="Popular", price=10.0, category="books")
+        users = [User(email=f"r{i}@test.com", password_hash="x", name=f"R{i}") for i in range(5)]
+        db.add_all([product] + users)
+        db.commit()
+        now = datetime.utcnow()
+        ages = {1: 5, 2: 4, 4: 3, 5: 2, 3: 1}  # rating -> days old
+        for user, rating in zip(users, [1, 2, 3, 4, 5]):
+            db.add(Review(user_id=user.id, product_id=product.id, rating=rating,
+                          created_at=now - timedelta(days=ages[rating])))
+        product.rating_sum, product.rating_count, product.rating_rate = 15, 5, 3.0
+        db.commit()
+        return product
+
+    def _walk(self, client, product_id, sort, limit=2):
+        ratings, cursor = [], None
+        while True:
+            params = {"sort": sort, "limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(f"/reviews/product/{product_id}", params=params)
+            assert response.status_code == 200
+            ratings += [review["rating"] for review in response.json()["reviews"]]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return ratings, response.json()
+
+    @pytest.mark.parametrize("sort,expected", [
+        ("newest", [3, 5, 4, 2, 1]),
+        ("highest", [5, 4, 3, 2, 1]),
+        ("lowest", [1, 2, 3, 4, 5]),
+    ])
+    def test_sorted_pages(self, client, reviewed_product, sort, expected):
+        """Test every sort order pages through all reviews exactly once."""
+        ratings, _ = self._walk(client, reviewed_product.id, sort)
+        assert ratings == expected
+
+    def test_summary_from_stored_aggregates(self, client, reviewed_product):
+        """Test the summary reflects all reviews even on a partial page."""
+        response = client.get(f"/reviews/product/{reviewed_product.id}?limit=1")
+        data = response.json()
+        assert len(data["reviews"]) == 1
+        assert data["total_reviews"] == 5
+        assert data["average_rating"] == 3.0
+
+    def test_page_cost_is_constant(self, client, reviewed_product, count_queries):
+        """Test a page never aggregates or loads the product's whole review set."""
+        with count_queries() as statements:
+            client.get(f"/reviews/product/{reviewed_product.id}?limit=2")
+
+        review_queries = [s for s in statements if "FROM reviews" in s]
+        assert len(review_queries) == 1
+        assert "LIMIT" in review_queries[0]
+        assert not any("avg(" in s.lower() or "count(" in s.lower() for s in statements)
+
+    def test_invalid_sort(self, client, reviewed_product):
+        """Test unknown sort options are rejected."""
+        response = client.get(f"/reviews/product/{reviewed_product.id}?sort=random")
+        assert response.status_code == 422
+
+
+class TestReviewAuthors:
+    """Tests for bulk-loaded, compact review authors."""
+
+    @pytest.fixture
+    def reviews(self, db):
+        product = Product(title="Popular", price=10.0, category="books")
+        users = [User(email=f"author{i}@test.com", password_hash="x", name=f"Author {i}") for i in range(4)]
+        db.add_all([product] + users)
+        db.commit()
+        db.add_all([Review(user_id=u.id, product_id=product.id, rating=4) for u in users])
+        db.commit()
+        return product, users
+
+    def test_product_reviews_load_authors_once(self, client, reviews, count_queries):
+        """Test a page loads all of its authors in one query."""
+        product, _ = reviews
+        url = f"/reviews/product/{product.id}"
+
+        with count_queries() as statements:
+            response = client.get(url)
+
+        assert len(response.json()["reviews"]) == 4
+        # product + reviews + authors
+        assert len(statements) == 3
+
+    def test_author_is_compact(self, client, reviews):
+        """Test public review payloads carry the author's id and name only."""
+        product, users = reviews
+
+        data = client.get(f"/reviews/product/{product.id}").json()
+
+        authors = {review["user"]["id"]: review["user"] for review in data["reviews"]}
+        assert authors[users[0].id] == {"id": users[0].id, "name": "Author 0"}
+        assert "email" not in str(data)
+
+    def test_my_reviews_query_count(self, client, db, reviews, count_queries):
+        """Test listing my reviews does not load the author per review."""
+        product, users = reviews
+        others = [Product(title=f"Other {i}", price=1.0, category="books") for i in range(3)]
+        db.add_all(others)
+        db.commit()
+        db.add_all([Review(user_id=users[0].id, product_id=p.id, rating=3) for p in others])
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(users[0].id)})}"}
+
+        with count_queries() as statements:
+            response = client.get("/reviews/user/me", headers=headers)
+
+        assert len(response.json()) == 4
+        assert all(review["user"]["name"] == "Author 0" for review in response.json())
+        # current user + reviews (+ at most one author query)
+        assert len(statements) <= 3
+
+
+class TestWishlistBatchCheck:
+    """Tests for checking many products against the wishlist at once."""
+
+    @pytest.fixture
+    def setup(self, db):
+        user = User(email="grid@test.com", password_hash="x", name="Grid")
+        products = [Product(title=f"Tile {i}", price=1.0, category="grid") for i in range(4)]
+        db.add_all([user] + products)
+        db.commit()
+        db.add_all([Wishlist(user_id=user.id, product_id=products[i].id) for i in (0, 2)])
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+        return headers, [p.id for p in products]
+
+    def test_batch_check(self, client, setup, count_queries):
+        """Test membership for many products comes back from one wishlist query."""
+        headers, ids = setup
+
+        with count_queries() as statements:
+            response = client.post("/wishlist/check", json={"product_ids": ids + [9999]}, headers=headers)
+
+        assert response.status_code == 200
+        assert response.json()["in_wishlist"] == {
+            str(ids[0]): True, str(ids[1]): False, str(ids[2]): True, str(ids[3]): False, "9999": False
+        }
+        # user lookup + wishlist
+        assert len(statements) == 2
+
+    def test_batch_check_limits(self, client, setup):
+        """Test empty and oversized batches are rejected."""
+        headers, _ = setup
+        assert client.post("/wishlist/check", json={"product_ids": []}, headers=headers).status_code == 422
+        too_many = {"product_ids": list(range(501))}
+        assert client.post("/wishlist/check", json=too_many, headers=headers).status_code == 422
+
+    def test_batch_check_requires_auth(self, client):
+        """Test the batch check needs a logged-in user."""
+        assert client.post("/wishlist/check", json={"product_ids": [1]}).status_code == 401
+
+    def test_product_listing_flags(self, client, setup):
+        """Test authenticated listings carry in_wishlist and anonymous ones do not."""
+        headers, ids = setup
+
+        flagged = {p["id"]: p["in_wishlist"] for p in client.get("/products/", headers=headers).json()}
+        anonymous = {p["id"]: p["in_wishlist"] for p in client.get("/products/").json()}
+
+        assert flagged == {ids[0]: True, ids[1]: False, ids[2]: True, ids[3]: False}
+        assert set(anonymous.values()) == {None}
+
+
+class TestWishlistCache:
+    """Tests for the per-user wishlist ID cache."""
+
+    @pytest.fixture
+    def setup(self, db):
+        user = User(email="cached@test.com", password_hash="x", name="Cached")
+        products = [Product(title=f"Item {i}", price=1.0, category="cache") for i in range(3)]
+        db.add_all([user] + products)
+        db.commit()
+        db.add(Wishlist(user_id=user.id, product_id=products[0].id))
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+        return headers, [p.id for p in products]
+
+    def _wishlist_queries(self, statements):
+        return [s for s in statements if "FROM wishlists" in s]
+
+    def test_checks_hit_cache(self, client, setup, count_queries):
+        """Test repeated checks do not query the wishlists table."""
+        headers, ids = setup
+        client.get(f"/wishlist/check/{ids[0]}", headers=headers)
+
+        with count_queries() as statements:
+            single = client.get(f"/wishlist/check/{ids[0]}", headers=headers).json()
+            batch = client.post("/wishlist/check", json={"product_ids": ids}, headers=headers).json()
+
+        assert single == {"in_wishlist": True}
+        assert batch["in_wishlist"][str(ids[1])] is False
+        assert self._wishlist_queries(statements) == []
+
+    def test_add_and_remove_update_cache(self, client, setup, count_queries):
+        """Test adds and removals are reflected without reloading the set."""
+        headers, ids = setup
+        client.get(f"/wishlist/check/{ids[0]}", headers=headers)
+
+        assert client.post("/wishlist", json={"product_id": ids[1]}, headers=headers).status_code == 201
+        client.delete(f"/wishlist/{ids[0]}", headers=headers)
+
+        with count_queries() as statements:
+            batch = client.post("/wishlist/check", json={"product_ids": ids}, headers=headers).json()
+
+        assert batch["in_wishlist"] == {str(ids[0]): False, str(ids[1]): True, str(ids[2]): False}
+        assert self._wishlist_queries(statements) == []
+
+    def test_duplicate_add_with_stale_cache(self, client, db, setup):
+        """Test the unique index rejects a duplicate another worker's cache did not see."""
+        headers, ids = setup
+        client.get(f"/wishlist/check/{ids[0]}", headers=headers)
+        user = db.query(User).filter(User.email == "cached@test.com").one()
+        db.add(Wishlist(user_id=user.id, product_id=ids[1]))  # Added elsewhere
+        db.commit()
+
+        response = client.post("/wishlist", json={"product_id": ids[1]}, headers=headers)
+
+        assert response.status_code == 400
+        assert db.query(Wishlist).filter(Wishlist.product_id == ids[1]).count() == 1
+        assert client.get(f"/products/{ids[1]}").json()["wishlist_count"] == 0
+
+
+class TestWishlistCounts:
+    """Tests for the per-product wishlist counter."""
+
+    @pytest.fixture
+    def shoppers(self, db):
+        users = [User(email=f"shopper{i}@test.com", password_hash="x", name=f"Shopper {i}") for i in range(2)]
+        db.add_all(users)
+        db.commit()
+        return [{"Authorization": f"Bearer {create_access_token({'sub': str(u.id)})}"} for u in users]
+
+    def _count(self, client, product_id):
+        return client.get(f"/products/{product_id}").json()["wishlist_count"]
+
+    def test_add_and_remove_move_count(self, client, shoppers, test_product):
+        """Test the count follows wishlist adds, duplicates and removals."""
+        for headers in shoppers:
+            client.post("/wishlist", json={"product_id": test_product.id}, headers=headers)
+        client.post("/wishlist", json={"product_id": test_product.id}, headers=shoppers[0])
+        assert self._count(client, test_product.id) == 2
+
+        client.delete(f"/wishlist/{test_product.id}", headers=shoppers[0])
+        client.delete(f"/wishlist/{test_product.id}", headers=shoppers[0])
+        assert self._count(client, test_product.id) == 1
+
+    def test_sort_wishlisted(self, client, shoppers, multiple_products):
+        """Test ?sort=wishlisted lists the most wished-for products first."""
+        ids = [p.id for p in multiple_products]
+        client.post("/wishlist", json={"product_id": ids[3]}, headers=shoppers[0])
+        client.post("/wishlist", json={"product_id": ids[3]}, headers=shoppers[1])
+        client.post("/wishlist", json={"product_id": ids[1]}, headers=shoppers[0])
+
+        listed = [p["id"] for p in client.get("/products?sort=wishlisted").json()]
+        assert listed[:2] == [ids[3], ids[1]]
+        assert listed[2:] == sorted(listed[2:], reverse=True)
+        assert client.get("/products?sort=cheapest").status_code == 422
+
+    def test_rebuild_fixes_drift(self, db, test_user, multiple_products):
+        """Test the rebuild recomputes counts across ID ranges."""
+        import wishlist_counts
+
+        db.add(Wishlist(user_id=test_user.id, product_id=multiple_products[0].id))
+        multiple_products[2].wishlist_count = 7
+        db.commit()
+
+        assert wishlist_counts.rebuild(db, range_size=2, dry_run=True) == 2
+        assert wishlist_counts.rebuild(db, range_size=2) == 2
+        db.expire_all()
+        assert [p.wishlist_count for p in multiple_products] == [1, 0, 0, 0, 0]
+        assert wishlist_counts.rebuild(db) == 0
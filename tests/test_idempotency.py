@@ -0,0 +1,134 @@
+"""Tests for Idempotency-Key handling on the order routes."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+import threading
+
+import pytest
+
+import crud
+import models
+import routers.orders as orders_router
+from auth import create_access_token
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def headers(test_user):
+    token = create_access_token({"sub": str(test_user.id)})
+    return {"Authorization": f"Bearer {token}", "X-User-ID": str(test_user.id)}
+
+
+class TestOrderIdempotency:
+    """Test retried order requests are answered once."""
+
+    def test_replay_returns_stored_order(self, client, db, headers, test_product, count_queries):
+        """Test a retry returns the original order without touching order tables."""
+        body = {"items": [{"product_id": test_product.id, "quantity": 2}]}
+        keyed = {**headers, "Idempotency-Key": "order-1"}
+
+        first = client.post("/orders/", json=body, headers=keyed)
+        with count_queries() as statements:
+            replay = client.post("/orders/", json=body, headers=keyed)
+
+        assert first.status_code == replay.status_code == 201
+        assert replay.json() == first.json()
+        assert db.query(models.Order).count() == 1
+        touched = " ".join(statements)
+        for table in ("orders", "order_items", "products", "cart_items"):
+            assert f" {table}" not in touched
+
+    def test_key_reused_with_different_body(self, client, headers, test_product):
+        """Test a key cannot be reused for a different request."""
+        keyed = {**headers, "Idempotency-Key": "order-2"}
+        client.post("/orders/", json={"items": [{"product_id": test_product.id, "quantity": 1}]}, headers=keyed)
+
+        response = client.post("/orders/", json={"items": [{"product_id": test_product.id, "quantity": 5}]}, headers=keyed)
+
+        assert response.status_code == 422
+
+    def test_from_cart_replay_after_cart_cleared(self, client, db, headers, test_product):
+        """Test a retried checkout returns the order instead of 'Cart is empty'."""
+        client.post("/cart/items", json={"product_id": test_product.id, "quantity": 1}, headers=headers)
+        keyed = {**headers, "Idempotency-Key": "checkout-1"}
+
+        first = client.post("/orders/from-cart", headers=keyed)
+        replay = client.post("/orders/from-cart", headers=keyed)
+
+        assert first.status_code == replay.status_code == 201
+        assert replay.json()["id"] == first.json()["id"]
+        assert db.query(models.Order).count() == 1
+
+    def test_failed_request_releases_key(self, client, headers, test_product):
+        """Test a failed attempt can be retried with the same key."""
+        keyed = {**headers, "Idempotency-Key": "checkout-2"}
+        assert client.post("/orders/from-cart", headers=keyed).status_code == 400
+
+        client.post("/cart/items", json={"product_id": test_product.id, "quantity": 1}, headers=headers)
+        assert client.post("/orders/from-cart", headers=keyed).status_code == 201
+
+    def test_concurrent_request_waits_for_original(self, client, db, headers, test_user, monkeypatch):
+        """Test a request arriving mid-flight waits for and replays the first response."""
+        fingerprint = "f" * 64
+        crud.claim_idempotency_key(db, test_user.id, "checkout-3", fingerprint)
+
+        def finish():
+            session = TestingSessionLocal()
+            crud.complete_idempotency_key(session, test_user.id, "checkout-3", 201, {"id": 42})
+            session.close()
+
+        monkeypatch.setattr(orders_router, "_fingerprint", lambda route, payload: fingerprint)
+        timer = threading.Timer(0.2, finish)
+        timer.start()
+        response = client.post("/orders/from-cart", headers={**headers, "Idempotency-Key": "checkout-3"})
+        timer.join()
+
+        assert response.status_code == 201
+        assert response.json() == {"id": 42}
+
+    def _stale_claim(self, db, user_id, key, fingerprint, lapse_in):
+        from datetime import datetime, timedelta
+        crud.claim_idempotency_key(db, user_id, key, fingerprint)
+        record = crud.get_idempotency_key(db, user_id, key)
+        record.locked_until = datetime.utcnow() + timedelta(seconds=lapse_in)
+        db.commit()
+
+    def test_lapsed_claim_is_taken_over(self, client, db, headers, test_user, test_product, monkeypatch):
+        """Test a claim whose owner died is taken over instead of blocking retries with 409."""
+        fingerprint = "a" * 64
+        self._stale_claim(db, test_user.id, "order-dead", fingerprint, -1)
+        monkeypatch.setattr(orders_router, "_fingerprint", lambda route, payload: fingerprint)
+        keyed = {**headers, "Idempotency-Key": "order-dead"}
+        body = {"items": [{"product_id": test_product.id, "quantity": 1}]}
+
+        first = client.post("/orders/", json=body, headers=keyed)
+        replay = client.post("/orders/", json=body, headers=keyed)
+
+        assert first.status_code == 201
+        assert replay.json()["id"] == first.json()["id"]
+        assert db.query(models.Order).count() == 1
+
+    def test_waiting_retry_takes_over_when_lease_lapses(self, client, db, headers, test_user, test_product, monkeypatch):
+        """Test a retry waiting on a claim proceeds once the owner's lease runs out."""
+        fingerprint = "b" * 64
+        self._stale_claim(db, test_user.id, "order-slow", fingerprint, 0.2)
+        monkeypatch.setattr(orders_router, "_fingerprint", lambda route, payload: fingerprint)
+
+        response = client.post(
+            "/orders/", json={"items": [{"product_id": test_product.id, "quantity": 1}]},
+            headers={**headers, "Idempotency-Key": "order-slow"}
+        )
+
+        assert response.status_code == 201
+
+    def test_lapsed_claim_keeps_its_request(self, client, db, headers, test_user, test_product):
+        """Test a different request cannot take over a lapsed claim."""
+        self._stale_claim(db, test_user.id, "order-other", "c" * 64, -1)
+
+        response = client.post(
+            "/orders/", json={"items": [{"product_id": test_product.id, "quantity": 1}]},
+            headers={**headers, "Idempotency-Key": "order-other"}
+        )
+
+        assert response.status_code == 422
@@ -0,0 +1,203 @@
+"""Tests for inventory reservation at checkout."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import models
+import schemas
+from database import Base
+from auth import create_access_token
+
+
+class TestStockReservation:
+    """Test stock is reserved atomically with the order."""
+
+    def test_order_decrements_stock(self, db, test_user):
+        """Test a successful order reserves its quantity."""
+        product = models.Product(title="Limited", price=5.0, category="drops", stock=10)
+        db.add(product)
+        db.commit()
+
+        crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=product.id, quantity=3)])
+
+        db.refresh(product)
+        assert product.stock == 7
+
+    def test_insufficient_stock_writes_nothing(self, db, test_user):
+        """Test a short line fails the whole order and reports per-item details."""
+        plenty = models.Product(title="Plenty", price=1.0, category="drops", stock=100)
+        scarce = models.Product(title="Scarce", price=1.0, category="drops", stock=1)
+        db.add_all([plenty, scarce])
+        db.commit()
+        items = [
+            schemas.OrderItemBase(product_id=plenty.id, quantity=5),
+            schemas.OrderItemBase(product_id=scarce.id, quantity=2),
+        ]
+
+        with pytest.raises(crud.InsufficientStockError) as exc:
+            crud.create_order(db, test_user.id, items)
+
+        assert [f.model_dump() for f in exc.value.failures] == [
+            {"product_id": scarce.id, "requested": 2, "available": 1}
+        ]
+        db.refresh(plenty)
+        assert plenty.stock == 100
+        assert db.query(models.Order).count() == 0
+
+    def test_untracked_stock_is_unlimited(self, db, test_user, test_product):
+        """Test products without a stock value are not limited."""
+        order = crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=test_product.id, quantity=999)])
+        assert order.total == pytest.approx(test_product.price * 999)
+
+    def test_non_positive_quantity_rejected(self, client, db, test_user):
+        """Test a negative line cannot restock a product or produce a negative total."""
+        product = models.Product(title="Guarded", price=5.0, category="drops", stock=1)
+        db.add(product)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"}
+
+        for quantity in (-50, 0):
+            response = client.post("/orders/", json={"items": [{"product_id": product.id, "quantity": quantity}]}, headers=headers)
+            assert response.status_code == 422
+        with pytest.raises(ValueError):
+            crud.create_order(db, test_user.id, [schemas.OrderItemBase.model_construct(product_id=product.id, quantity=-50)])
+
+        db.refresh(product)
+        assert product.stock == 1
+        assert db.query(models.Order).count() == 0
+
+    def test_from_cart_conflict_keeps_cart(self, client, db, test_user):
+        """Test a failed checkout returns 409 and leaves the cart intact."""
+        product = models.Product(title="Last one", price=9.0, category="drops", stock=1)
+        db.add(product)
+        db.commit()
+        headers = {
+            "Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}",
+            "X-User-ID": str(test_user.id),
+        }
+        client.post("/cart/items", json={"product_id": product.id, "quantity": 2}, headers=headers)
+
+        response = client.post("/orders/from-cart", headers=headers)
+
+        assert response.status_code == 409
+        assert response.json()["detail"]["items"][0]["product_id"] == product.id
+        assert len(client.get("/cart/", headers=headers).json()["items"]) == 1
+
+    def _order(self, db, user, stock=10, quantity=3):
+        product = models.Product(title="Returnable", price=5.0, category="drops", stock=stock)
+        db.add(product)
+        db.commit()
+        order = crud.create_order(db, user.id, [schemas.OrderItemBase(product_id=product.id, quantity=quantity)])
+        return product, order
+
+    def test_cancel_returns_stock(self, db, test_user, test_product):
+        """Test cancelling an order puts its units back, untracked products stay untracked."""
+        product, order = self._order(db, test_user)
+        crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=test_product.id, quantity=2)])
+
+        crud.update_order_status(db, order.id, "cancelled")
+        crud.update_order_status(db, order.id, "cancelled")
+
+        db.refresh(product)
+        db.refresh(test_product)
+        assert product.stock == 10
+        assert test_product.stock is None
+
+    def test_uncancel_reserves_again(self, db, test_user):
+        """Test reopening a cancelled order takes its units again."""
+        product, order = self._order(db, test_user)
+        crud.update_order_status(db, order.id, "cancelled")
+
+        crud.update_order_status(db, order.id, "pending")
+
+        db.refresh(product)
+        assert product.stock == 7
+
+    def test_uncancel_shortfall_keeps_order_cancelled(self, client, db, test_user, admin_headers):
+        """Test reopening fails with 409 when the units were sold in the meantime."""
+        product, order = self._order(db, test_user, stock=3, quantity=3)
+        crud.update_order_status(db, order.id, "cancelled")
+        crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=product.id, quantity=2)])
+
+        response = client.patch(f"/orders/{order.id}/status?status=pending", headers=admin_headers)
+
+        assert response.status_code == 409
+        assert response.json()["detail"]["items"] == [{"product_id": product.id, "requested": 3, "available": 1}]
+        db.expire_all()
+        assert db.get(models.Order, order.id).status == "cancelled"
+        assert db.get(models.Product, product.id).stock == 1
+
+    def test_bulk_cancel_and_reopen_move_stock(self, db, test_user):
+        """Test the bulk status change returns and re-reserves stock all or nothing."""
+        product, first = self._order(db, test_user, stock=10, quantity=3)
+        second = crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=product.id, quantity=4)])
+
+        crud.bulk_update_order_status(db, [first.id, second.id], "pending", "cancelled")
+        db.refresh(product)
+        assert product.stock == 10
+
+        crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=product.id, quantity=5)])
+        with pytest.raises(crud.InsufficientStockError):
+            crud.bulk_update_order_status(db, [first.id, second.id], "cancelled", "pending")
+        db.expire_all()
+        assert {o.status for o in db.query(models.Order).filter(models.Order.id.in_([first.id, second.id]))} == {"cancelled"}
+        assert db.get(models.Product, product.id).stock == 5
+
+        assert crud.bulk_update_order_status(db, [first.id], "cancelled", "pending") == [first.id]
+        db.refresh(product)
+        assert product.stock == 2
+
+
+class TestConcurrentCheckout:
+    """Flash-sale style load against a single SKU."""
+
+    CHECKOUTS = 300
+    STOCK = 120
+
+    def test_parallel_checkouts_never_oversell(self, tmp_path):
+        """Test hundreds of parallel checkouts sell exactly the available stock."""
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'flash_sale.db'}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        with Session() as setup:
+            user = models.User(email="buyer@example.com", password_hash="x")
+            product = models.Product(title="Flash SKU", price=1.0, category="drops", stock=self.STOCK)
+            setup.add_all([user, product])
+            setup.commit()
+            user_id, product_id = user.id, product.id
+
+        def checkout(_):
+            with Session() as session:
+                try:
+                    crud.create_order(session, user_id, [schemas.OrderItemBase(product_id=product_id, quantity=1)])
+                    return True
+                except crud.InsufficientStockError:
+                    return False
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(checkout, range(self.CHECKOUTS)))
+        elapsed = time.perf_counter() - started
+
+        with Session() as check:
+            remaining = check.get(models.Product, product_id).stock
+            orders = check.query(models.Order).count()
+
+        assert results.count(True) == self.STOCK
+        assert orders == self.STOCK
+        assert remaining == 0
+        # Throughput is informational: shown with `pytest -s`
+        print(f"\n{self.CHECKOUTS} checkouts in {elapsed:.2f}s ({self.CHECKOUTS / elapsed:.0f}/s)")
+        engine.dispose()
@@ -0,0 +1,191 @@
+"""Tests for the transactional outbox and its worker."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+import models
+import outbox
+import schemas
+from metrics import ORDERS_TOTAL, OUTBOX_PENDING, OUTBOX_LAG
+from tests.conftest import TestingSessionLocal
+
+
+def _events(db, event_type=None):
+    query = db.query(models.OutboxEvent)
+    if event_type:
+        query = query.filter(models.OutboxEvent.event_type == event_type)
+    return query.order_by(models.OutboxEvent.id).all()
+
+
+class TestEnqueue:
+    """Test events are written with the change that caused them."""
+
+    def test_order_writes_event(self, db, test_user, test_product):
+        """Test placing an order adds an order.created event."""
+        order = crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=test_product.id, quantity=2)])
+
+        events = _events(db, "order.created")
+        assert len(events) == 1
+        assert events[0].aggregate_id == order.id
+        assert events[0].status == "pending"
+
+    def test_failed_order_writes_no_event(self, db, test_user):
+        """Test an order rolled back for stock leaves no event behind."""
+        product = models.Product(title="Scarce", price=1.0, category="drops", stock=1)
+        db.add(product)
+        db.commit()
+
+        with pytest.raises(crud.InsufficientStockError):
+            crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=product.id, quantity=5)])
+
+        assert _events(db) == []
+
+    def test_registration_writes_event(self, client, db):
+        """Test registering adds a user.registered event."""
+        response = client.post("/auth/register", json={
+            "email": "new@example.com", "password": "password123", "name": "New User"
+        })
+        assert response.status_code in (200, 201)
+
+        events = _events(db, "user.registered")
+        assert len(events) == 1
+        assert events[0].aggregate_id == response.json()["id"]
+
+
+class TestProcessBatch:
+    """Test the worker drains events."""
+
+    @pytest.fixture
+    def handlers(self, monkeypatch):
+        registry = defaultdict(list)
+        monkeypatch.setattr(outbox, "HANDLERS", registry)
+        return registry
+
+    def test_marks_events_done(self, db, test_user, test_product):
+        """Test handled events are marked done and run the metric handlers."""
+        crud.create_order(db, test_user.id, [schemas.OrderItemBase(product_id=test_product.id, quantity=1)])
+        before = ORDERS_TOTAL._value.get()
+
+        assert outbox.process_batch(db) == 1
+
+        event = _events(db, "order.created")[0]
+        assert event.status == "done"
+        assert event.processed_at is not None
+        assert ORDERS_TOTAL._value.get() == before + 1
+        assert outbox.process_batch(db) == 0
+
+    def test_failure_backs_off_and_blocks_same_aggregate(self, db, handlers, caplog):
+        """Test a failing event is retried later and holds back its aggregate only."""
+        calls = []
+
+        def flaky(payload):
+            calls.append(payload["n"])
+            if payload["n"] == 1:
+                raise RuntimeError("boom")
+
+        handlers["test"].append(flaky)
+        outbox.enqueue(db, "order", 1, "test", {"n": 1})
+        outbox.enqueue(db, "order", 1, "test", {"n": 2})
+        outbox.enqueue(db, "order", 2, "test", {"n": 3})
+        db.commit()
+
+        with caplog.at_level("ERROR", logger="outbox"):
+            outbox.process_batch(db)
+
+        first, second, other = _events(db)
+        assert [r.exc_info[0] for r in caplog.records] == [RuntimeError]
+        assert calls == [1, 3]
+        assert first.status == "pending"
+        assert first.attempts == 1
+        assert "boom" in first.last_error
+        assert first.available_at > datetime.utcnow()
+        assert second.status == "pending"
+        assert other.status == "done"
+
+        # Still backing off: nothing is due
+        assert outbox.process_batch(db) == 0
+
+        handlers["test"][:] = [lambda payload: calls.append(payload["n"])]
+        first.available_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        outbox.process_batch(db)
+        assert calls == [1, 3, 1]
+
+        # The follower becomes eligible once its predecessor is done
+        outbox.process_batch(db)
+        assert calls == [1, 3, 1, 2]
+        assert [e.status for e in _events(db)] == ["done", "done", "done"]
+
+    def test_gives_up_after_max_attempts(self, db, handlers, monkeypatch):
+        """Test an event that keeps failing is parked as dead."""
+        monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 1)
+
+        def broken(payload):
+            raise RuntimeError("still broken")
+
+        handlers["test"].append(broken)
+        outbox.enqueue(db, "order", 1, "test", {})
+        db.commit()
+
+        outbox.process_batch(db)
+
+        assert _events(db)[0].status == "dead"
+
+
+class TestQueueMetrics:
+    """Test queue depth and lag are exported."""
+
+    def test_pending_and_lag(self, db):
+        """Test the gauges reflect pending events and their age."""
+        event = outbox.enqueue(db, "order", 1, "test", {})
+        event.created_at = datetime.utcnow() - timedelta(seconds=60)
+        db.commit()
+
+        outbox.update_queue_metrics(db)
+
+        assert OUTBOX_PENDING._value.get() == 1
+        assert OUTBOX_LAG._value.get() >= 60
+
+        event.status = "done"
+        db.commit()
+        outbox.update_queue_metrics(db)
+
+        assert OUTBOX_PENDING._value.get() == 0
+        assert OUTBOX_LAG._value.get() == 0
+
+
+class TestIdempotencyPurge:
+    """Test the worker removes expired idempotency keys."""
+
+    def _key(self, db, user_id, key, expires_at):
+        db.add(models.IdempotencyKey(
+            user_id=user_id, key=key, fingerprint="f", status="completed",
+            created_at=expires_at - crud.IDEMPOTENCY_TTL, expires_at=expires_at
+        ))
+
+    def test_worker_purges_expired_keys(self, db, test_user):
+        """Test a running worker deletes expired keys and keeps live ones."""
+        now = datetime.utcnow()
+        self._key(db, test_user.id, "old", now - timedelta(hours=1))
+        self._key(db, test_user.id, "live", now + timedelta(hours=1))
+        db.commit()
+
+        worker = outbox.OutboxWorker(session_factory=TestingSessionLocal, interval=0.01, purge_interval=3600)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 5
+            while db.query(models.IdempotencyKey).count() > 1 and time.monotonic() < deadline:
+                db.rollback()
+                time.sleep(0.01)
+        finally:
+            worker.stop()
+
+        assert [record.key for record in db.query(models.IdempotencyKey)] == ["live"]
+
@@ -0,0 +1,207 @@
+"""Tests for incrementally maintained product rating aggregates."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+import pytest
+
+import models
+import ratings
+from auth import create_access_token, get_password_hash
+
+
+@pytest.fixture
+def reviewers(db):
+    users = [
+        models.User(email=f"reviewer{i}@test.com", password_hash=get_password_hash("pass"), name=f"Reviewer {i}")
+        for i in range(3)
+    ]
+    db.add_all(users)
+    db.commit()
+    return [{"Authorization": f"Bearer {create_access_token({'sub': str(u.id)})}"} for u in users]
+
+
+@pytest.fixture
+def product(db):
+    product = models.Product(title="Rated", price=10.0, category="books")
+    db.add(product)
+    db.commit()
+    return product
+
+
+def _aggregates(db, product_id):
+    product = db.query(models.Product).filter(models.Product.id == product_id).populate_existing().one()
+    return product.rating_sum, product.rating_count, product.rating_rate
+
+
+class TestIncrementalRating:
+    """Test review writes adjust the stored aggregates."""
+
+    def test_create_update_delete(self, client, db, reviewers, product):
+        """Test sum, count and derived rate follow every kind of review write."""
+        first = client.post("/reviews", json={"product_id": product.id, "rating": 5}, headers=reviewers[0]).json()
+        client.post("/reviews", json={"product_id": product.id, "rating": 2}, headers=reviewers[1])
+        assert _aggregates(db, product.id) == (7, 2, 3.5)
+
+        client.put(f"/reviews/{first['id']}", json={"rating": 4}, headers=reviewers[0])
+        assert _aggregates(db, product.id) == (6, 2, 3.0)
+
+        client.put(f"/reviews/{first['id']}", json={"comment": "Still good"}, headers=reviewers[0])
+        assert _aggregates(db, product.id) == (6, 2, 3.0)
+
+        client.delete(f"/reviews/{first['id']}", headers=reviewers[0])
+        assert _aggregates(db, product.id) == (2, 1, 2.0)
+
+    def test_star_histogram(self, client, db, reviewers, product):
+        """Test per-star counters follow review writes and are exposed."""
+        first = client.post("/reviews", json={"product_id": product.id, "rating": 5}, headers=reviewers[0]).json()
+        client.post("/reviews", json={"product_id": product.id, "rating": 5}, headers=reviewers[1])
+        client.post("/reviews", json={"product_id": product.id, "rating": 1}, headers=reviewers[2])
+        client.put(f"/reviews/{first['id']}", json={"rating": 3}, headers=reviewers[0])
+
+        summary = client.get(f"/reviews/product/{product.id}").json()
+        assert summary["rating_histogram"] == {"1": 1, "2": 0, "3": 1, "4": 0, "5": 1}
+
+        client.delete(f"/reviews/{first['id']}", headers=reviewers[0])
+        detail = client.get(f"/products/{product.id}").json()
+        assert detail["rating_histogram"] == {"1": 1, "2": 0, "3": 0, "4": 0, "5": 1}
+
+    def test_write_does_not_rescan_reviews(self, client, db, reviewers, product, count_queries):
+        """Test a write to a tracked product issues one UPDATE and no aggregate over reviews."""
+        client.post("/reviews", json={"product_id": product.id, "rating": 2}, headers=reviewers[1])
+
+        with count_queries() as statements:
+            client.post("/reviews", json={"product_id": product.id, "rating": 4}, headers=reviewers[0])
+
+        assert not any("avg(" in s.lower() or "count(reviews" in s.lower() for s in statements)
+        assert sum(s.lstrip().upper().startswith("UPDATE PRODUCTS") for s in statements) == 1
+
+    def test_imported_rating_is_replaced(self, client, db, reviewers, test_product):
+        """Test the first review replaces a seeded rating, agreeing with reconcile."""
+        summary = client.get(f"/reviews/product/{test_product.id}").json()
+        assert (summary["total_reviews"], summary["average_rating"]) == (0, 0.0)
+
+        client.post("/reviews", json={"product_id": test_product.id, "rating": 5}, headers=reviewers[0])
+
+        assert _aggregates(db, test_product.id) == (5, 1, 5.0)
+        summary = client.get(f"/reviews/product/{test_product.id}").json()
+        assert summary["total_reviews"] == sum(summary["rating_histogram"].values()) == 1
+        assert ratings.reconcile(db) == 0
+
+    def test_untracked_product_with_reviews_recomputed(self, client, db, test_user, reviewers, product):
+        """Test a product whose reviews predate the aggregates is recomputed on the next write."""
+        db.add(models.Review(user_id=test_user.id, product_id=product.id, rating=4))
+        db.commit()
+
+        client.post("/reviews", json={"product_id": product.id, "rating": 2}, headers=reviewers[0])
+
+        assert _aggregates(db, product.id) == (6, 2, 3.0)
+        assert ratings.reconcile(db) == 0
+
+
+class TestReconcile:
+    """Test aggregates can be recomputed from the reviews."""
+
+    def test_fixes_drift_in_chunks(self, db, reviewers, test_user, multiple_products):
+        """Test drifted products are corrected across chunk boundaries."""
+        for i, product in enumerate(multiple_products):
+            db.add(models.Review(user_id=test_user.id, product_id=product.id, rating=i + 1))
+            product.rating_sum, product.rating_count, product.rating_rate = 99, 9, 1.0
+        multiple_products[0].rating_sum, multiple_products[0].rating_count = 1, 1  # Already right
+        multiple_products[0].stars_1 = 1
+        db.commit()
+
+        assert ratings.reconcile(db, range_size=2) == 4
+        assert [_aggregates(db, p.id) for p in multiple_products] == [
+            (1, 1, 1.0), (2, 1, 2.0), (3, 1, 3.0), (4, 1, 4.0), (5, 1, 5.0)
+        ]
+        assert ratings.reconcile(db, range_size=2) == 0
+
+    def test_backfills_star_counts(self, db, test_user, reviewers, product):
+        """Test reconciliation fills in the per-star counters."""
+        others = [models.User(email=f"extra{i}@test.com", password_hash="x") for i in range(2)]
+        db.add_all(others)
+        db.commit()
+        for user, rating in zip([test_user] + others, [5, 5, 2]):
+            db.add(models.Review(user_id=user.id, product_id=product.id, rating=rating))
+        db.commit()
+
+        assert ratings.reconcile(db) == 1
+
+        db.refresh(product)
+        assert product.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 2}
+
+    def test_rate_matches_live_rounding(self, db, test_user, product):
+        """Test reconcile rounds like review writes (17 / 4 is 4.3) and repairs a drifted rate."""
+        others = [models.User(email=f"half{i}@test.com", password_hash="x") for i in range(3)]
+        db.add_all(others)
+        db.commit()
+        for user, rating in zip([test_user] + others, [5, 4, 4, 4]):
+            db.add(models.Review(user_id=user.id, product_id=product.id, rating=rating))
+        db.commit()
+
+        assert ratings.reconcile(db) == 1
+        assert _aggregates(db, product.id) == (17, 4, 4.3)
+        assert ratings.reconcile(db) == 0
+
+        product.rating_rate = 4.2
+        db.commit()
+        assert ratings.reconcile(db) == 1
+        assert _aggregates(db, product.id) == (17, 4, 4.3)
+
+    def test_parallel_workers(self, tmp_path):
+        """Test ID ranges reconciled in a process pool give the same result."""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from database import Base
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'ratings.db'}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        user = models.User(email="bulk@test.com", password_hash="x")
+        products = [models.Product(title=f"P{i}", price=1.0, category="bulk") for i in range(20)]
+        db.add_all([user] + products)
+        db.commit()
+        db.add_all([models.Review(user_id=user.id, product_id=p.id, rating=i % 5 + 1) for i, p in enumerate(products)])
+        db.commit()
+
+        progress = []
+        corrected = ratings.reconcile(db, range_size=3, workers=2, progress=lambda *args: progress.append(args))
+
+        assert corrected == 20
+        assert len(progress) == 7
+        assert progress[-1] == (7, 7, 20, 20)
+
+        db.expire_all()
+        assert [p.rating_count for p in products] == [1] * 20
+        assert [p.rating_histogram[i % 5 + 1] for i, p in enumerate(products)] == [1] * 20
+        db.close()
+        engine.dispose()
+
+    def test_dry_run_writes_nothing(self, db, test_user, product):
+        """Test a dry run reports drift but leaves the products alone."""
+        db.add(models.Review(user_id=test_user.id, product_id=product.id, rating=4))
+        db.commit()
+
+        assert ratings.reconcile(db, dry_run=True) == 1
+        assert _aggregates(db, product.id) == (None, 0, 0.0)
+        assert ratings.reconcile(db) == 1
+
+    def test_include_imported(self, db, test_product):
+        """Test seeded ratings are reset only when asked to."""
+        assert ratings.reconcile(db, include_imported=True) == 1
+        assert _aggregates(db, test_product.id) == (0, 0, 0.0)
+
+    def test_clears_tracked_product_without_reviews(self, db, product):
+        """Test a tracked product whose reviews are gone is reset."""
+        product.rating_sum, product.rating_count, product.rating_rate = 8, 2, 4.0
+        db.commit()
+
+        assert ratings.reconcile(db) == 1
+        assert _aggregates(db, product.id) == (0, 0, 0.0)
+
+    def test_leaves_imported_ratings(self, db, test_product):
+        """Test never-reviewed imported ratings are not wiped."""
+        assert ratings.reconcile(db) == 0
+        assert _aggregates(db, test_product.id) == (None, 100, 4.5)
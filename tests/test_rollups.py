@@ -0,0 +1,169 @@
+"""Tests for incrementally maintained sales rollups."""
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+import models
+import rollups
+import schemas
+
+
+def _rollups(db):
+    rows = db.query(models.SalesRollup).populate_existing().all()
+    return {(r.dimension, r.key): (round(r.revenue, 2), r.units, r.orders) for r in rows}
+
+
+@pytest.fixture
+def catalog(db):
+    products = [
+        models.Product(title="Phone", price=100.0, category="electronics"),
+        models.Product(title="Cable", price=5.0, category="electronics"),
+        models.Product(title="Shirt", price=20.0, category="clothing"),
+    ]
+    db.add_all(products)
+    db.commit()
+    return products
+
+
+def _order(db, user, lines):
+    return crud.create_order(db, user.id, [
+        schemas.OrderItemBase(product_id=product.id, quantity=quantity) for product, quantity in lines
+    ])
+
+
+class TestIncrementalRollups:
+    """Test rollups follow order writes."""
+
+    def test_order_updates_every_dimension(self, db, test_user, catalog):
+        """Test an order adds revenue, units and one order per dimension key."""
+        phone, cable, shirt = catalog
+        _order(db, test_user, [(phone, 1), (cable, 2), (shirt, 1)])
+        _order(db, test_user, [(cable, 1)])
+
+        assert _rollups(db) == {
+            ("total", "all"): (135.0, 5, 2),
+            ("category", "electronics"): (115.0, 4, 2),
+            ("category", "clothing"): (20.0, 1, 1),
+            ("product", str(phone.id)): (100.0, 1, 1),
+            ("product", str(cable.id)): (15.0, 3, 2),
+            ("product", str(shirt.id)): (20.0, 1, 1),
+        }
+
+    def test_cancel_and_reinstate(self, db, test_user, catalog):
+        """Test cancelling removes an order and reinstating adds it back."""
+        phone = catalog[0]
+        order = _order(db, test_user, [(phone, 2)])
+
+        crud.update_order_status(db, order.id, "cancelled")
+        assert _rollups(db)[("total", "all")] == (0.0, 0, 0)
+
+        # Repeating a status is a no-op
+        crud.update_order_status(db, order.id, "cancelled")
+        assert _rollups(db)[("total", "all")] == (0.0, 0, 0)
+
+        crud.update_order_status(db, order.id, "completed")
+        assert _rollups(db)[("total", "all")] == (200.0, 2, 1)
+
+    def test_cancel_after_recategorising_reverses_original_category(self, db, test_user, catalog):
+        """Test a reversal hits the category the order was counted under."""
+        phone = catalog[0]
+        order = _order(db, test_user, [(phone, 1)])
+        phone.category = "phones"
+        db.commit()
+
+        crud.update_order_status(db, order.id, "cancelled")
+
+        totals = _rollups(db)
+        assert totals[("category", "electronics")] == (0.0, 0, 0)
+        assert ("category", "phones") not in totals
+
+        crud.update_order_status(db, order.id, "pending")
+        assert _rollups(db)[("category", "electronics")] == (100.0, 1, 1)
+
+    def test_completing_does_not_double_count(self, db, test_user, catalog):
+        """Test moving between counted statuses leaves rollups alone."""
+        order = _order(db, test_user, [(catalog[0], 1)])
+
+        crud.update_order_status(db, order.id, "completed")
+
+        assert _rollups(db)[("total", "all")] == (100.0, 1, 1)
+
+
+class TestRebuild:
+    """Test rollups can be recomputed from the orders."""
+
+    def test_rebuild_matches_incremental(self, db, test_user, catalog):
+        """Test a rebuild reproduces the incrementally maintained rows."""
+        phone, cable, shirt = catalog
+        _order(db, test_user, [(phone, 1), (shirt, 3)])
+        cancelled = _order(db, test_user, [(cable, 4)])
+        crud.update_order_status(db, cancelled.id, "cancelled")
+        expected = {k: v for k, v in _rollups(db).items() if v != (0.0, 0, 0)}
+
+        db.query(models.SalesRollup).delete()
+        db.commit()
+        assert rollups.rebuild(db) == 1
+
+        assert _rollups(db) == expected
+
+    def test_rebuild_range_leaves_other_days(self, db, test_user, catalog):
+        """Test rebuilding a range only replaces rows in that range."""
+        order = _order(db, test_user, [(catalog[0], 1)])
+        old_day = (datetime.utcnow() - timedelta(days=10)).date()
+        db.add(models.SalesRollup(day=old_day, dimension="total", key="all", revenue=1.0, units=1, orders=1))
+        # Drift on the order's day gets repaired
+        db.query(models.SalesRollup).filter(models.SalesRollup.day == order.created_at.date()).delete()
+        db.commit()
+
+        rollups.rebuild(db, start=order.created_at.date(), end=order.created_at.date())
+
+        days = {r.day: r.revenue for r in db.query(models.SalesRollup).filter(models.SalesRollup.dimension == "total")}
+        assert days == {old_day: 1.0, order.created_at.date(): 100.0}
+
+
+class TestSalesEndpoint:
+    """Test the /analytics/sales endpoint."""
+
+    def test_requires_auth(self, client):
+        """Test reports need a logged-in user."""
+        response = client.get("/analytics/sales")
+        assert response.status_code == 401
+
+    def test_requires_admin(self, client, auth_headers):
+        """Test a logged-in customer cannot read store-wide sales."""
+        response = client.get("/analytics/sales", headers=auth_headers)
+        assert response.status_code == 403
+
+    def test_sales_by_category(self, client, db, test_user, catalog, admin_headers):
+        """Test rollup rows are returned for the requested dimension."""
+        _order(db, test_user, [(catalog[0], 1), (catalog[2], 2)])
+
+        response = client.get("/analytics/sales?dimension=category", headers=admin_headers)
+
+        assert response.status_code == 200
+        data = {row["key"]: row for row in response.json()}
+        assert data["electronics"]["revenue"] == 100.0
+        assert data["clothing"]["units"] == 2
+        assert data["clothing"]["day"] == datetime.utcnow().date().isoformat()
+
+    def test_filters_by_key_and_range(self, client, db, test_user, catalog, admin_headers):
+        """Test key and date filters narrow the result."""
+        phone = catalog[0]
+        _order(db, test_user, [(phone, 1), (catalog[2], 1)])
+        yesterday = (datetime.utcnow() - timedelta(days=1)).date().isoformat()
+
+        response = client.get(f"/analytics/sales?dimension=product&key={phone.id}", headers=admin_headers)
+        assert [row["key"] for row in response.json()] == [str(phone.id)]
+
+        response = client.get(f"/analytics/sales?end={yesterday}", headers=admin_headers)
+        assert response.json() == []
+
+    def test_rejects_inverted_range(self, client, admin_headers):
+        """Test start after end is a client error."""
+        response = client.get("/analytics/sales?start=2024-02-01&end=2024-01-01", headers=admin_headers)
+        assert response.status_code == 400
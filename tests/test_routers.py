@@ -4,7 +4,9 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'Backend'))
 
+import auth
 from auth import create_access_token
+import models
 
 
 class TestAuthRouter:
@@ -272,6 +274,88 @@ class TestCartRouter:
         assert "total" in data
         assert data["total"] == test_product.price * 2
 
+    def test_get_cart_query_count_is_constant(self, client, db, test_user, count_queries):
+        """Test a large cart loads in a fixed number of queries."""
+        products = [models.Product(title=f"P{i}", price=1.0 + i, category="bulk") for i in range(30)]
+        db.add_all(products)
+        db.commit()
+        db.add_all([
+            models.CartItem(user_id=test_user.id, product_id=p.id, quantity=2) for p in products
+        ])
+        db.commit()
+        headers = {"X-User-ID": str(test_user.id)}
+
+        with count_queries() as statements:
+            response = client.get("/cart/", headers=headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) == 30
+        assert data["total"] == pytest.approx(sum((1.0 + i) * 2 for i in range(30)))
+        assert len(statements) == 2
+
+    def test_cart_summary(self, client, test_user, multiple_products, count_queries):
+        """Test the summary is cached and refreshed after a mutation."""
+        headers = {"X-User-ID": str(test_user.id)}
+        p1, p2 = multiple_products[0].id, multiple_products[1].id
+        client.post("/cart/items", json={"product_id": p1, "quantity": 2}, headers=headers)
+
+        response = client.get("/cart/summary", headers=headers)
+        assert response.json() == {"count": 1, "quantity": 2, "total": 20.0}
+
+        with count_queries() as statements:
+            client.get("/cart/summary", headers=headers)
+        assert statements == []
+
+        client.post("/cart/items", json={"product_id": p2, "quantity": 1}, headers=headers)
+        response = client.get("/cart/summary", headers=headers)
+        assert response.json() == {"count": 2, "quantity": 3, "total": 40.0}
+
+    def test_cart_summary_empty(self, client, test_user):
+        """Test the summary of an empty cart."""
+        response = client.get("/cart/summary", headers={"X-User-ID": str(test_user.id)})
+        assert response.status_code == 200
+        assert response.json() == {"count": 0, "quantity": 0, "total": 0.0}
+
+    def test_bulk_update_cart(self, client, test_user, multiple_products):
+        """Test setting, incrementing and removing lines in one request."""
+        headers = {"X-User-ID": str(test_user.id)}
+        p1, p2, p3, p4 = [p.id for p in multiple_products[:4]]
+        for product_id in (p1, p2, p3):
+            client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+        response = client.put("/cart/", json={
+            "set": [{"product_id": p1, "quantity": 5}],
+            "increment": [{"product_id": p2, "quantity": 2}, {"product_id": p4, "quantity": 1}],
+            "remove": [p3],
+        }, headers=headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        quantities = {item["product_id"]: item["quantity"] for item in data["items"]}
+        assert quantities == {p1: 5, p2: 3, p4: 1}
+        assert data["total"] == pytest.approx(10.0 * 5 + 20.0 * 3 + 40.0)
+
+    def test_bulk_update_cart_unknown_product(self, client, test_user, test_product):
+        """Test the whole batch is rejected when a product does not exist."""
+        headers = {"X-User-ID": str(test_user.id)}
+        response = client.put("/cart/", json={
+            "set": [{"product_id": test_product.id, "quantity": 2}],
+            "increment": [{"product_id": 9999, "quantity": 1}],
+        }, headers=headers)
+
+        assert response.status_code == 404
+        assert client.get("/cart/", headers=headers).json()["items"] == []
+
+    def test_bulk_update_cart_duplicate_product(self, client, test_user, test_product):
+        """Test a product can only appear in one operation."""
+        response = client.put("/cart/", json={
+            "set": [{"product_id": test_product.id, "quantity": 2}],
+            "remove": [test_product.id],
+        }, headers={"X-User-ID": str(test_user.id)})
+
+        assert response.status_code == 400
+
     def test_update_cart_item(self, client, test_user, test_product):
         """Test updating cart item quantity."""
         # Add item first
@@ -361,6 +445,44 @@ class TestOrdersRouter:
         data = response.json()
         assert len(data) >= 1
 
+    def test_list_orders_keyset_pagination(self, client, test_user, test_product):
+        """Test order history pages follow X-Next-Cursor without gaps or repeats."""
+        token = create_access_token({"sub": str(test_user.id)})
+        headers = {"Authorization": f"Bearer {token}"}
+        created = [
+            client.post("/orders/", json={"items": [{"product_id": test_product.id, "quantity": 1}]},
+                        headers=headers).json()["id"]
+            for _ in range(5)
+        ]
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+            response = client.get("/orders/", params=params, headers=headers)
+            seen += [order["id"] for order in response.json()]
+            pages += 1
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+
+        assert seen == sorted(created, reverse=True)
+        assert pages == 3
+
+    def test_list_orders_query_count_is_constant(self, client, db, test_user, multiple_products, count_queries):
+        """Test a page of orders loads items and products in a fixed number of queries."""
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"}
+        items = [{"product_id": p.id, "quantity": 1} for p in multiple_products]
+        for _ in range(4):
+            client.post("/orders/", json={"items": items}, headers=headers)
+
+        with count_queries() as statements:
+            response = client.get("/orders/", headers=headers)
+
+        assert len(response.json()) == 4
+        assert all(len(order["items"]) == 5 for order in response.json())
+        # orders + archived orders + order_items + products; the user is cached
+        assert len(statements) == 4
+
     def test_get_order(self, client, test_user, test_product):
         """Test getting a specific order."""
         token = create_access_token({"sub": str(test_user.id)})
@@ -383,6 +505,98 @@ class TestOrdersRouter:
         assert response.json()["id"] == order_id
 
 
+class TestOrderFulfilment:
+    """Test bulk status transitions and the status queue."""
+
+    @pytest.fixture
+    def headers(self, test_user):
+        return {"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"}
+
+    @pytest.fixture
+    def admin(self, headers, test_user, monkeypatch):
+        monkeypatch.setattr(auth, "ADMIN_USER_IDS", frozenset({test_user.id}))
+        return headers
+
+    @pytest.fixture
+    def orders(self, client, headers, test_product):
+        ids = []
+        for _ in range(5):
+            response = client.post(
+                "/orders/", json={"items": [{"product_id": test_product.id, "quantity": 1}]}, headers=headers
+            )
+            ids.append(response.json()["id"])
+        return ids
+
+    def test_bulk_status_update(self, client, db, admin, orders, count_queries):
+        """Test many orders move in one conditional UPDATE and others are reported skipped."""
+        client.patch(f"/orders/{orders[0]}/status?status=completed", headers=admin)
+
+        with count_queries() as statements:
+            response = client.patch("/orders/status", json={
+                "order_ids": orders + [9999], "expected_status": "pending", "status": "completed"
+            }, headers=admin)
+
+        assert response.status_code == 200
+        assert response.json() == {"updated": orders[1:], "skipped": [orders[0], 9999]}
+        assert sum(statement.lstrip().upper().startswith("UPDATE ORDERS") for statement in statements) == 1
+        statuses = {o.status for o in db.query(models.Order).populate_existing()}
+        assert statuses == {"completed"}
+
+    def test_bulk_cancel_updates_rollups(self, client, db, admin, orders, test_product):
+        """Test cancelling in bulk removes the orders from the sales rollups."""
+        response = client.patch("/orders/status", json={
+            "order_ids": orders[:3], "expected_status": "pending", "status": "cancelled"
+        }, headers=admin)
+        assert response.json()["updated"] == orders[:3]
+
+        total = db.query(models.SalesRollup).filter(models.SalesRollup.dimension == "total").populate_existing().one()
+        assert total.orders == 2
+        assert total.revenue == pytest.approx(2 * test_product.price)
+
+    def test_bulk_rejects_noop_transition(self, client, admin, orders):
+        """Test expected_status equal to status is a client error."""
+        response = client.patch("/orders/status", json={
+            "order_ids": orders, "expected_status": "pending", "status": "pending"
+        }, headers=admin)
+        assert response.status_code == 400
+
+    def test_queue_pages_oldest_first(self, client, admin, orders):
+        """Test the queue lists orders in a status oldest first with a cursor."""
+        client.patch(f"/orders/{orders[2]}/status?status=completed", headers=admin)
+
+        seen, cursor = [], None
+        while True:
+            params = {"status": "pending", "limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get("/orders/queue", params=params, headers=admin)
+            assert response.status_code == 200
+            seen += [order["id"] for order in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+
+        assert seen == [orders[0], orders[1], orders[3], orders[4]]
+
+    def test_queue_requires_auth(self, client):
+        """Test the queue is not public."""
+        assert client.get("/orders/queue").status_code == 401
+
+    def test_customers_get_403(self, client, headers, orders):
+        """Test a logged-in customer can neither list nor change other orders."""
+        assert client.get("/orders/queue", headers=headers).status_code == 403
+        response = client.patch("/orders/status", json={
+            "order_ids": orders, "expected_status": "pending", "status": "cancelled"
+        }, headers=headers)
+        assert response.status_code == 403
+        assert client.patch(f"/orders/{orders[0]}/status?status=cancelled", headers=headers).status_code == 403
+
+    def test_status_index(self):
+        """Test the queue is backed by a (status, created_at) index."""
+        indexes = {index.name: [c.name for c in index.columns] for index in models.Order.__table__.indexes}
+        assert indexes["ix_orders_status_created"] == ["status", "created_at"]
+
+
 class TestHealthEndpoints:
     """Test health check endpoints."""
 
@@ -0,0 +1,59 @@
+"""Tests for application import time and lazily loaded subsystems."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..', 'Backend')
+
+# Generous enough for CI runners, tight enough to catch a heavy eager import
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "elapsed": elapsed,
+    "azure": any(m.startswith("azure") for m in sys.modules),
+    "blob_storage": "blob_storage" in sys.modules,
+}))
+"""
+
+
+@pytest.fixture(scope="module")
+def import_probe():
+    """Import main in a fresh interpreter so nothing is already cached."""
+    env = dict(os.environ)
+    env.pop("AZURE_STORAGE_CONNECTION_STRING", None)
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestStartup:
+    """Test cold-start cost of importing the application."""
+
+    def test_import_within_budget(self, import_probe):
+        """Test importing main stays within the startup budget."""
+        assert import_probe["elapsed"] < IMPORT_BUDGET_SECONDS
+
+    def test_azure_sdk_not_imported(self, import_probe):
+        """Test the Azure SDK is not loaded until uploads are used."""
+        assert import_probe["azure"] is False
+        assert import_probe["blob_storage"] is False
+
+    def test_storage_status_loads_lazily(self, client):
+        """Test the uploads router still works once storage is touched."""
+        response = client.get("/uploads/status")
+        assert response.status_code == 200
+        assert "configured" in response.json()